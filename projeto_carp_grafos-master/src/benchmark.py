@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import platform
+import subprocess
+import tempfile
+from multiprocessing import Pool, cpu_count
+
+from utils_grafo import ler_arquivo_dat
+from solucao_writer import salvar_solucao
+from busca_local import busca_local
+from escalonador import ordenar_por_custo
+from comparar_resultados import ler_valores_referencia
+from main import CONSTRUTORES
+
+# Fases medidas em cada instância, na ordem em que rodam
+FASES = ('leitura', 'matriz', 'construcao', 'melhoria', 'escrita')
+
+def pico_rss_mb():
+    """Pico de memória residente do processo atual (ru_maxrss é KB no Linux e bytes no macOS)"""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+def medir_instancia(args):
+    """Resolve uma instância cronometrando cada fase separadamente"""
+    nome_arq, caminho, pasta_solucoes, pasta_cache, config = args
+    tempos = {}
+    try:
+        inicio = time.perf_counter()
+        grafo, capacidade = ler_arquivo_dat(caminho, pasta_cache)
+        tempos['leitura'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        grafo.matriz_distancias()
+        tempos['matriz'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        rotas = CONSTRUTORES[config['motor']](grafo, capacidade, grafo.deposito)
+        tempos['construcao'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        custos = cargas = None
+        if config['busca_local']:
+            rotas, custos, cargas = busca_local(rotas, grafo, capacidade, grafo.deposito,
+                                                config['tempo_busca_local'], resumo=True)
+        tempos['melhoria'] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        caminho_saida = os.path.join(pasta_solucoes, f"sol-{os.path.splitext(nome_arq)[0]}.dat")
+        custo = salvar_solucao(rotas, grafo, capacidade, caminho_saida, grafo.deposito,
+                               custos=custos, cargas=cargas)
+        tempos['escrita'] = time.perf_counter() - inicio
+    except Exception as e:
+        return {'nome': os.path.splitext(nome_arq)[0], 'erro': str(e)}
+
+    tempos['total'] = sum(tempos.values())
+    return {
+        'nome': os.path.splitext(nome_arq)[0],
+        'tempos': tempos,
+        'pico_rss_mb': pico_rss_mb(),
+        'custo': custo,
+        'rotas': len(rotas),
+    }
+
+def versao_codigo():
+    """Commit atual do repositório, se houver git"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def resumir(resultados):
+    ok = [r for r in resultados if 'erro' not in r]
+    gaps = [r['gap'] for r in ok if r.get('gap') is not None]
+    return {
+        'instancias': len(resultados),
+        'erros': len(resultados) - len(ok),
+        'tempos': {fase: sum(r['tempos'][fase] for r in ok) for fase in FASES + ('total',)},
+        'pico_rss_mb': max((r['pico_rss_mb'] for r in ok), default=0),
+        'custo_total': sum(r['custo'] for r in ok),
+        'gap_medio': sum(gaps) / len(gaps) if gaps else None,
+    }
+
+def comparar(atual, base, tolerancia_tempo, tolerancia_gap):
+    """Lista as regressões do resultado atual em relação à base.
+
+    Só entram na comparação as instâncias resolvidas nas duas execuções. O
+    tempo total pode crescer até tolerancia_tempo (fração); o gap médio e o
+    custo de cada instância, até tolerancia_gap pontos percentuais.
+    """
+    atuais = {r['nome']: r for r in atual['resultados'] if 'erro' not in r}
+    anteriores = {r['nome']: r for r in base['resultados'] if 'erro' not in r}
+    comuns = sorted(atuais.keys() & anteriores.keys())
+    regressoes = []
+    if not comuns:
+        return regressoes
+
+    tempo_atual = sum(atuais[n]['tempos']['total'] for n in comuns)
+    tempo_base = sum(anteriores[n]['tempos']['total'] for n in comuns)
+    if tempo_atual > tempo_base * (1 + tolerancia_tempo):
+        regressoes.append(f"Tempo total {tempo_atual:.2f}s contra {tempo_base:.2f}s na base "
+                          f"(+{(tempo_atual / tempo_base - 1) * 100:.1f}%)")
+
+    com_gap = [n for n in comuns if atuais[n].get('gap') is not None and anteriores[n].get('gap') is not None]
+    if com_gap:
+        gap_atual = sum(atuais[n]['gap'] for n in com_gap) / len(com_gap)
+        gap_base = sum(anteriores[n]['gap'] for n in com_gap) / len(com_gap)
+        if gap_atual > gap_base + tolerancia_gap:
+            regressoes.append(f"Gap médio {gap_atual:.2f}% contra {gap_base:.2f}% na base")
+
+    for nome in comuns:
+        if atuais[nome]['custo'] > anteriores[nome]['custo'] * (1 + tolerancia_gap / 100):
+            regressoes.append(f"{nome}: custo {atuais[nome]['custo']} contra {anteriores[nome]['custo']} na base")
+    return regressoes
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Mede tempo por fase, memória e qualidade do solver")
+    parser.add_argument('--motor', choices=sorted(CONSTRUTORES), default='guloso')
+    parser.add_argument('--tempo-busca-local', type=float, default=10.0)
+    parser.add_argument('--sem-busca-local', action='store_true')
+    parser.add_argument('--instancias', nargs='+', default=None,
+                        help="mede só estas instâncias (nomes sem .dat)")
+    parser.add_argument('--passo', type=int, default=1,
+                        help="usa uma a cada PASSO instâncias, em ordem alfabética")
+    parser.add_argument('--processos', type=int, default=1,
+                        help="processos em paralelo (1 deixa os tempos comparáveis entre máquinas ocupadas)")
+    parser.add_argument('--sem-cache', action='store_true',
+                        help="mede a leitura do .dat sem o cache de arrays")
+    parser.add_argument('--saida', default=None,
+                        help="arquivo JSON com os resultados (padrão: benchmarks/<commit>-<motor>.json)")
+    parser.add_argument('--base', default=None,
+                        help="JSON de uma execução anterior; sai com erro se houver regressão")
+    parser.add_argument('--tolerancia-tempo', type=float, default=0.2,
+                        help="aumento relativo de tempo aceito em relação à base")
+    parser.add_argument('--tolerancia-gap', type=float, default=0.5,
+                        help="aumento de gap (pontos percentuais) aceito em relação à base")
+    return parser.parse_args()
+
+def main():
+    argumentos = ler_argumentos()
+    config = {
+        'motor': argumentos.motor,
+        'busca_local': not argumentos.sem_busca_local,
+        'tempo_busca_local': argumentos.tempo_busca_local,
+    }
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    pasta_instancias = os.path.abspath(os.path.join(script_dir, '..', 'selected_instances'))
+    pasta_cache = None if argumentos.sem_cache else os.path.abspath(os.path.join(script_dir, 'cache'))
+    referencia = ler_valores_referencia(os.path.join(script_dir, '..', 'padroes', 'reference_values.csv'))
+
+    arquivos = sorted(nome for nome in os.listdir(pasta_instancias) if nome.endswith('.dat'))
+    if argumentos.instancias:
+        arquivos = [nome for nome in arquivos if os.path.splitext(nome)[0] in argumentos.instancias]
+    arquivos = arquivos[::argumentos.passo]
+    arquivos = ordenar_por_custo([(nome, os.path.join(pasta_instancias, nome)) for nome in arquivos])
+
+    with tempfile.TemporaryDirectory() as pasta_solucoes:
+        args = [(nome, caminho, pasta_solucoes, pasta_cache, config) for nome, caminho in arquivos]
+        # Um processo novo por instância, para que o pico de RSS seja só dela
+        with Pool(processes=argumentos.processos, maxtasksperchild=1) as pool:
+            resultados = []
+            for resultado in pool.imap_unordered(medir_instancia, args, chunksize=1):
+                if 'erro' not in resultado and resultado['nome'] in referencia:
+                    custo_ref = referencia[resultado['nome']][0]
+                    resultado['referencia'] = custo_ref
+                    resultado['gap'] = (resultado['custo'] - custo_ref) / custo_ref * 100
+                resultados.append(resultado)
+                print(f"{resultado['nome']}: " + (f"erro {resultado['erro']}" if 'erro' in resultado else
+                      f"{resultado['tempos']['total']:.2f}s, {resultado['pico_rss_mb']:.0f} MB, custo {resultado['custo']}"))
+
+    resultados.sort(key=lambda r: r['nome'])
+    execucao = {
+        'commit': versao_codigo(),
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'maquina': {'python': platform.python_version(), 'cpus': cpu_count()},
+        'config': config,
+        'resumo': resumir(resultados),
+        'resultados': resultados,
+    }
+    saida = argumentos.saida
+    if saida is None:
+        os.makedirs(os.path.join(script_dir, 'benchmarks'), exist_ok=True)
+        saida = os.path.join(script_dir, 'benchmarks', f"{execucao['commit'] or 'sem-commit'}-{config['motor']}.json")
+    with open(saida, 'w') as f:
+        json.dump(execucao, f, indent=2)
+
+    resumo = execucao['resumo']
+    print(f"\n{resumo['instancias']} instâncias, {resumo['erros']} com erro")
+    for fase, tempo in resumo['tempos'].items():
+        print(f"  {fase}: {tempo:.2f}s")
+    print(f"Pico de RSS: {resumo['pico_rss_mb']:.0f} MB")
+    if resumo['gap_medio'] is not None:
+        print(f"Gap médio para a referência: {resumo['gap_medio']:.2f}%")
+    print(f"Resultados salvos em {saida}")
+
+    if argumentos.base:
+        with open(argumentos.base, 'r') as f:
+            base = json.load(f)
+        regressoes = comparar(execucao, base, argumentos.tolerancia_tempo, argumentos.tolerancia_gap)
+        if regressoes:
+            print("\nRegressões em relação à base:")
+            for regressao in regressoes:
+                print(f"  {regressao}")
+            sys.exit(1)
+        print("\nSem regressões em relação à base")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import time
+
+import numpy as np
+
+from busca_local import BuscaLocal, EPSILON, orientar_rotas
+from greedy_constructor import orientar_rota
+from split_constructor import split
+from instrumentacao import medido, contar
+
+INF = float('inf')
+
+def perturbar(rota_gigante, rng, forca=1):
+    """Aplica 'forca' movimentos double-bridge na rota gigante.
+
+    A sequência é cortada em quatro trechos A B C D e remontada como A C B D,
+    uma mudança que a busca local não desfaz com um único movimento.
+    """
+    rota = list(rota_gigante)
+    if len(rota) < 4:
+        return rota
+    for _ in range(forca):
+        i, j, k = sorted(rng.choice(np.arange(1, len(rota)), size=3, replace=False).tolist())
+        rota = rota[:i] + rota[j:k] + rota[i:j] + rota[k:]
+    return rota
+
+@medido()
+def busca_local_iterada(rotas, grafo, capacidade, deposito='1', tempo_limite=None, iteracoes=None,
+                        tempo_busca_local=None, forca=1, limiar=0.01, semente=0, inicio=None):
+    """Busca local iterada sobre a solução do construtor.
+
+    A cada iteração a melhor solução vira uma rota gigante, é perturbada,
+    dividida de novo em rotas pelo Split e melhorada pela busca local. A nova
+    solução substitui a corrente se não for mais que 'limiar' pior que ela, e a
+    melhor já vista (incumbente) é sempre guardada.
+
+    Para quando acabar o tempo_limite (segundos, de relógio) ou o número de
+    iterações; sem nenhum dos dois, faz uma única busca local. 'inicio' é o
+    perf_counter_ns do começo da resolução, usado para medir os clocks.
+
+    Retorna (rotas, estatisticas), com estatisticas contendo custo, iteracoes,
+    clocks (ns desde o início até o fim), clocks_melhor_sol (ns até achar a
+    melhor solução) e os custos e cargas de cada rota (para salvar_solucao).
+    """
+    if inicio is None:
+        inicio = time.perf_counter_ns()
+    if not rotas:
+        decorrido = time.perf_counter_ns() - inicio
+        return rotas, {'custo': 0, 'iteracoes': 0, 'clocks': decorrido, 'clocks_melhor_sol': decorrido,
+                       'custos': [], 'cargas': []}
+
+    prazo = time.perf_counter() + tempo_limite if tempo_limite is not None else INF
+    if iteracoes is None:
+        iteracoes = INF if tempo_limite is not None else 0
+    rng = np.random.default_rng(semente)
+
+    rotas = [orientar_rota(rota, grafo, deposito)[0] for rota in rotas]
+    bl = BuscaLocal(rotas, grafo, capacidade, deposito).executar(tempo_busca_local)
+    melhor_rotas, melhor_custo = bl.resultado(), bl.custo_total()
+    clocks_melhor_sol = time.perf_counter_ns() - inicio
+    atual_rotas, atual_custo = melhor_rotas, melhor_custo
+
+    iteracao = 0
+    while iteracao < iteracoes and time.perf_counter() < prazo:
+        iteracao += 1
+        contar('busca_iterada.iteracoes')
+        gigante = perturbar([s for rota in atual_rotas for s in rota], rng, forca)
+        novas = split(gigante, grafo, capacidade, deposito)
+        limite = tempo_busca_local
+        if prazo != INF:
+            restante = max(0.0, prazo - time.perf_counter())
+            limite = restante if limite is None else min(limite, restante)
+        bl = BuscaLocal(novas, grafo, capacidade, deposito).executar(limite)
+        custo = bl.custo_total()
+
+        if custo < melhor_custo - EPSILON:
+            melhor_rotas, melhor_custo = bl.resultado(), custo
+            clocks_melhor_sol = time.perf_counter_ns() - inicio
+            atual_rotas, atual_custo = melhor_rotas, custo
+        elif custo <= atual_custo * (1 + limiar):
+            atual_rotas, atual_custo = bl.resultado(), custo
+        else:
+            # Volta para a incumbente em vez de se afastar demais dela
+            atual_rotas, atual_custo = melhor_rotas, melhor_custo
+
+    # Direções finais pela programação dinâmica (a busca local não inverte serviços isolados)
+    melhor_rotas, custos, cargas = orientar_rotas(melhor_rotas, grafo, deposito)
+    return melhor_rotas, {
+        'custo': sum(custos),
+        'iteracoes': iteracao,
+        'clocks': time.perf_counter_ns() - inicio,
+        'clocks_melhor_sol': clocks_melhor_sol,
+        'custos': custos,
+        'cargas': cargas,
+    }
@@ -0,0 +1,333 @@
+import time
+from collections import deque
+
+import numpy as np
+
+from greedy_constructor import orientar_rota
+from instrumentacao import medido, contar
+
+INF = float('inf')
+EPSILON = 1e-9
+
+class BuscaLocal:
+    """Melhoria de uma solução com 2-opt, or-opt, relocate, swap e cross-exchange.
+
+    Cada serviço recebe um id inteiro e cada rota vira uma lista de ids. Os
+    pontos de início e fim de cada serviço são reindexados em uma submatriz de
+    distâncias em listas Python, o que deixa cada consulta barata. Todos os
+    movimentos são avaliados pelo delta de custo em O(1): para o 2-opt,
+    prefixos dos deslocamentos da rota nos dois sentidos dão o custo do trecho
+    invertido.
+
+    A vizinhança é granular: movimentos entre rotas só são tentados com os
+    serviços mais próximos (lista de vizinhos). Bits "don't look" evitam
+    reavaliar serviços cujas rotas não mudaram desde a última tentativa sem
+    melhoria.
+    """
+
+    def __init__(self, rotas, grafo, capacidade, deposito='1', vizinhos=10, tamanho_segmento=3):
+        matriz = grafo.matriz_distancias()
+        indice = matriz.indice
+        self.capacidade = capacidade
+        self.tamanho_segmento = tamanho_segmento
+        self.servicos = [s for rota in rotas for s in rota]
+
+        # Submatriz de distâncias só com os pontos usados pelos serviços
+        pontos = sorted({indice[deposito]}
+                        | {indice[s['u']] for s in self.servicos}
+                        | {indice[s['v']] for s in self.servicos})
+        local = {p: i for i, p in enumerate(pontos)}
+        self.D = matriz.dist[np.ix_(pontos, pontos)].tolist()
+        self.deposito = local[indice[deposito]]
+
+        self.a = [local[indice[s['u']]] for s in self.servicos]  # ponto de início
+        self.b = [local[indice[s['v']]] for s in self.servicos]  # ponto de fim
+        self.q = [s['demanda'] for s in self.servicos]
+        self.aresta = [s['tipo'] == 'aresta' for s in self.servicos]
+        # Nós têm início igual ao fim, então podem entrar em trechos invertidos
+        self.reversivel = [s['tipo'] != 'arco' for s in self.servicos]
+        self.invertido = [False] * len(self.servicos)
+
+        self.rotas = []
+        k = 0
+        for rota in rotas:
+            self.rotas.append(list(range(k, k + len(rota))))
+            k += len(rota)
+
+        self.rota_de = [0] * len(self.servicos)
+        self.pos = [0] * len(self.servicos)
+        self.cargas = []
+        self.prefixo_carga = []
+        self.prefixo_ida = []
+        self.prefixo_volta = []
+        self.fim_reversivel = []
+        for r in range(len(self.rotas)):
+            self.cargas.append(0)
+            self.prefixo_carga.append(None)
+            self.prefixo_ida.append(None)
+            self.prefixo_volta.append(None)
+            self.fim_reversivel.append(None)
+            self._atualizar(r)
+
+        self.vizinhos = self._calcular_vizinhos(grafo, vizinhos)
+
+    def _calcular_vizinhos(self, grafo, quantidade):
+        """Para cada serviço, os serviços mais próximos considerando as duas direções das arestas"""
+        # As listas são da instância (MatrizServicos), só traduzidas para os ids locais
+        matriz = grafo.matriz_servicos()
+        local = {s['id']: k for k, s in enumerate(self.servicos)}
+        global_para_local = [local.get(s['id']) for s in matriz.servicos]
+        proximos = matriz.vizinhos(quantidade, simetrico=True).tolist()
+        return [[global_para_local[j] for j in proximos[matriz.indice[s['id']]] if global_para_local[j] is not None]
+                for s in self.servicos]
+
+    def _atualizar(self, r):
+        """Recalcula posições, cargas e prefixos da rota r depois de uma mudança"""
+        rota = self.rotas[r]
+        D, a, b, q = self.D, self.a, self.b, self.q
+        carga = [0]
+        ida = [0]
+        volta = [0]
+        for i, k in enumerate(rota):
+            self.rota_de[k] = r
+            self.pos[k] = i
+            carga.append(carga[-1] + q[k])
+            if i + 1 < len(rota):
+                proximo = rota[i + 1]
+                ida.append(ida[-1] + D[b[k]][a[proximo]])
+                volta.append(volta[-1] + D[a[proximo]][b[k]])
+        self.cargas[r] = carga[-1]
+        self.prefixo_carga[r] = carga
+        self.prefixo_ida[r] = ida
+        self.prefixo_volta[r] = volta
+
+        # fim_reversivel[i]: último índice j tal que rota[i..j] não tem arcos
+        fim = [0] * len(rota)
+        proximo_fim = len(rota) - 1
+        for i in range(len(rota) - 1, -1, -1):
+            if not self.reversivel[rota[i]]:
+                proximo_fim = i - 1
+            fim[i] = proximo_fim
+        self.fim_reversivel[r] = fim
+
+    def _fim_antes(self, r, i):
+        """Ponto onde a rota r está antes da posição i"""
+        return self.b[self.rotas[r][i - 1]] if i > 0 else self.deposito
+
+    def _inicio_em(self, r, i):
+        """Ponto para onde a rota r segue a partir da posição i"""
+        rota = self.rotas[r]
+        return self.a[rota[i]] if i < len(rota) else self.deposito
+
+    def _orientacoes(self, k):
+        """(início, fim, inverter) para cada forma de atender o serviço k"""
+        if self.aresta[k]:
+            return ((self.a[k], self.b[k], False), (self.b[k], self.a[k], True))
+        return ((self.a[k], self.b[k], False),)
+
+    def custo_total(self):
+        D, a, b = self.D, self.a, self.b
+        total = sum(s['custo'] for s in self.servicos)
+        for rota in self.rotas:
+            if not rota:
+                continue
+            total += D[self.deposito][a[rota[0]]] + D[b[rota[-1]]][self.deposito]
+            for k, proximo in zip(rota, rota[1:]):
+                total += D[b[k]][a[proximo]]
+        return total
+
+    def _melhor_movimento(self, k):
+        """Melhor movimento de melhoria envolvendo o serviço k, ou None"""
+        D = self.D
+        r = self.rota_de[k]
+        i = self.pos[k]
+        rota = self.rotas[r]
+        melhor = (-EPSILON, None)
+
+        # Relocate / or-opt: move o segmento rota[i:i+L]
+        for L in range(1, self.tamanho_segmento + 1):
+            if i + L > len(rota):
+                break
+            primeiro, ultimo = rota[i], rota[i + L - 1]
+            x0, y0 = self._fim_antes(r, i), self._inicio_em(r, i + L)
+            if L == 1:
+                orientacoes = self._orientacoes(k)
+            else:
+                orientacoes = ((self.a[primeiro], self.b[ultimo], False),)
+            retirada = D[x0][self.a[primeiro]] + D[self.b[ultimo]][y0] - D[x0][y0]
+            demanda = self.prefixo_carga[r][i + L] - self.prefixo_carga[r][i]
+
+            # Dentro da mesma rota, todas as posições fora do segmento
+            for p in range(len(rota) + 1):
+                if i <= p <= i + L:
+                    continue
+                x, y = self._fim_antes(r, p), self._inicio_em(r, p)
+                for inicio, fim, inverter in orientacoes:
+                    delta = D[x][inicio] + D[fim][y] - D[x][y] - retirada
+                    if delta < melhor[0]:
+                        melhor = (delta, ('mover', r, i, L, r, p, inverter))
+
+            # Entre rotas, só perto dos vizinhos (somente serviços isolados)
+            if L == 1:
+                for t in self.vizinhos[k]:
+                    r2 = self.rota_de[t]
+                    if r2 == r or self.cargas[r2] + demanda > self.capacidade:
+                        continue
+                    for p in (self.pos[t], self.pos[t] + 1):
+                        x, y = self._fim_antes(r2, p), self._inicio_em(r2, p)
+                        for inicio, fim, inverter in orientacoes:
+                            delta = D[x][inicio] + D[fim][y] - D[x][y] - retirada
+                            if delta < melhor[0]:
+                                melhor = (delta, ('mover', r, i, 1, r2, p, inverter))
+
+        # Swap e cross-exchange com segmentos que começam em vizinhos de k
+        x_a = self._fim_antes(r, i)
+        for t in self.vizinhos[k]:
+            r2 = self.rota_de[t]
+            if r2 == r:
+                continue
+            j = self.pos[t]
+            rota2 = self.rotas[r2]
+            x_b = self._fim_antes(r2, j)
+            for la in range(1, self.tamanho_segmento + 1):
+                if i + la > len(rota):
+                    break
+                demanda_a = self.prefixo_carga[r][i + la] - self.prefixo_carga[r][i]
+                y_a = self._inicio_em(r, i + la)
+                for lb in range(1, self.tamanho_segmento + 1):
+                    if j + lb > len(rota2):
+                        break
+                    demanda_b = self.prefixo_carga[r2][j + lb] - self.prefixo_carga[r2][j]
+                    if (self.cargas[r] - demanda_a + demanda_b > self.capacidade
+                            or self.cargas[r2] - demanda_b + demanda_a > self.capacidade):
+                        continue
+                    y_b = self._inicio_em(r2, j + lb)
+                    if la == 1 and lb == 1:
+                        # Swap: cada serviço pode entrar na vaga do outro em qualquer orientação
+                        delta_a = min(D[x_a][ini] + D[fim][y_a] for ini, fim, _ in self._orientacoes(t))
+                        delta_b = min(D[x_b][ini] + D[fim][y_b] for ini, fim, _ in self._orientacoes(k))
+                        inv_t = min(self._orientacoes(t), key=lambda o: D[x_a][o[0]] + D[o[1]][y_a])[2]
+                        inv_k = min(self._orientacoes(k), key=lambda o: D[x_b][o[0]] + D[o[1]][y_b])[2]
+                        delta = (delta_a + delta_b
+                                 - D[x_a][self.a[k]] - D[self.b[k]][y_a]
+                                 - D[x_b][self.a[t]] - D[self.b[t]][y_b])
+                        if delta < melhor[0]:
+                            melhor = (delta, ('troca', k, t, inv_k, inv_t))
+                        continue
+                    ini_a, fim_a = self.a[k], self.b[rota[i + la - 1]]
+                    ini_b, fim_b = self.a[t], self.b[rota2[j + lb - 1]]
+                    delta = (D[x_a][ini_b] + D[fim_b][y_a] + D[x_b][ini_a] + D[fim_a][y_b]
+                             - D[x_a][ini_a] - D[fim_a][y_a] - D[x_b][ini_b] - D[fim_b][y_b])
+                    if delta < melhor[0]:
+                        melhor = (delta, ('cruzamento', r, i, la, r2, j, lb))
+
+        # 2-opt: inverte rota[i..j] quando o trecho não tem arcos
+        ida, volta = self.prefixo_ida[r], self.prefixo_volta[r]
+        for j in range(i + 1, self.fim_reversivel[r][i] + 1 if self.reversivel[k] else i):
+            x, y = self._fim_antes(r, i), self._inicio_em(r, j + 1)
+            delta = (D[x][self.b[rota[j]]] + (volta[j] - volta[i]) + D[self.a[k]][y]
+                     - D[x][self.a[k]] - (ida[j] - ida[i]) - D[self.b[rota[j]]][y])
+            if delta < melhor[0]:
+                melhor = (delta, ('2opt', r, i, j))
+
+        return melhor
+
+    def _inverter(self, k):
+        self.a[k], self.b[k] = self.b[k], self.a[k]
+        self.invertido[k] = not self.invertido[k]
+
+    def _aplicar(self, movimento):
+        """Aplica o movimento e devolve as rotas alteradas"""
+        tipo = movimento[0]
+        if tipo == 'mover':
+            _, r, i, L, r2, p, inverter = movimento
+            segmento = self.rotas[r][i:i + L]
+            del self.rotas[r][i:i + L]
+            if r2 == r and p > i:
+                p -= L
+            if inverter:
+                self._inverter(segmento[0])
+            self.rotas[r2][p:p] = segmento
+            return {r, r2}
+        if tipo == 'troca':
+            _, k, t, inv_k, inv_t = movimento
+            r, i, r2, j = self.rota_de[k], self.pos[k], self.rota_de[t], self.pos[t]
+            self.rotas[r][i], self.rotas[r2][j] = t, k
+            if inv_k:
+                self._inverter(k)
+            if inv_t:
+                self._inverter(t)
+            return {r, r2}
+        if tipo == 'cruzamento':
+            _, r, i, la, r2, j, lb = movimento
+            segmento_a = self.rotas[r][i:i + la]
+            segmento_b = self.rotas[r2][j:j + lb]
+            self.rotas[r][i:i + la] = segmento_b
+            self.rotas[r2][j:j + lb] = segmento_a
+            return {r, r2}
+        _, r, i, j = movimento  # 2opt
+        trecho = self.rotas[r][i:j + 1]
+        for k in trecho:
+            self._inverter(k)
+        self.rotas[r][i:j + 1] = trecho[::-1]
+        return {r}
+
+    def executar(self, tempo_limite=None):
+        """Aplica movimentos de melhoria até o ótimo local ou o fim do tempo"""
+        prazo = time.perf_counter() + tempo_limite if tempo_limite is not None else INF
+        ativo = [True] * len(self.servicos)
+        fila = deque(range(len(self.servicos)))
+
+        while fila and time.perf_counter() < prazo:
+            k = fila.popleft()
+            ativo[k] = False
+            delta, movimento = self._melhor_movimento(k)
+            contar('busca_local.avaliacoes')
+            if movimento is None:
+                continue
+            contar(f"busca_local.{movimento[0]}")
+            for r in self._aplicar(movimento):
+                self._atualizar(r)
+                for s in self.rotas[r]:
+                    if not ativo[s]:
+                        ativo[s] = True
+                        fila.append(s)
+        return self
+
+    def resultado(self):
+        """Rotas não vazias no formato de listas de serviços (dicts)"""
+        rotas = []
+        for rota in self.rotas:
+            if not rota:
+                continue
+            nova = []
+            for k in rota:
+                s = self.servicos[k]
+                nova.append(dict(s, u=s['v'], v=s['u']) if self.invertido[k] else s)
+            rotas.append(nova)
+        return rotas
+
+def orientar_rotas(rotas, grafo, deposito):
+    """(rotas, custos, cargas) com cada aresta na melhor direção, prontos para salvar_solucao.
+
+    A busca local não inverte um serviço isolado, então as direções em que ela
+    para nem sempre são as melhores; a programação dinâmica corrige isso.
+    """
+    orientadas = [orientar_rota(rota, grafo, deposito) for rota in rotas]
+    return ([rota for rota, _ in orientadas], [custo for _, custo in orientadas],
+            [sum(s['demanda'] for s in rota) for rota, _ in orientadas])
+
+@medido()
+def busca_local(rotas, grafo, capacidade, deposito='1', tempo_limite=None, vizinhos=10, resumo=False):
+    """Melhora as rotas do construtor com busca local dentro do tempo dado (segundos).
+
+    Com resumo=True devolve (rotas, custos, cargas), prontos para salvar_solucao.
+    """
+    if not rotas:
+        return (rotas, [], []) if resumo else rotas
+    # Parte das arestas já na melhor direção para a sequência do construtor
+    rotas = [orientar_rota(rota, grafo, deposito)[0] for rota in rotas]
+    bl = BuscaLocal(rotas, grafo, capacidade, deposito, vizinhos).executar(tempo_limite)
+    if resumo:
+        return orientar_rotas(bl.resultado(), grafo, deposito)
+    return bl.resultado()
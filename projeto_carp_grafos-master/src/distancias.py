@@ -0,0 +1,258 @@
+import os
+import tempfile
+import multiprocessing
+from collections import OrderedDict
+from heapq import heappush, heappop
+from multiprocessing import Pool
+
+import numpy as np
+
+from grafo_cache import memoizado
+from instrumentacao import contar, medido
+from memoria_compartilhada import ArrayCompartilhado
+
+INF = float('inf')
+
+# Abaixo disso, abrir um pool custa mais que rodar os Dijkstras em sequência
+MINIMO_VERTICES_PARALELO = 200
+
+# Bytes por par (origem, destino): distância float64 + predecessor int32
+BYTES_POR_PAR = 12
+
+# Estado de cada processo do pool da matriz (ver _iniciar_trabalhador)
+_ADJ = None
+_DIST = None
+_PRED = None
+
+@medido()
+def dijkstra_indices(adj, origem, destino=None):
+    """Dijkstra sobre a lista de adjacência (destino, custo, tipo) de um GrafoCompacto"""
+    n = len(adj)
+    dist = [INF] * n
+    pred = [-1] * n
+    dist[origem] = 0
+    pq = [(0, origem)]
+
+    while pq:
+        d, u = heappop(pq)
+        if d > dist[u]:
+            continue
+        if u == destino:
+            break
+        for v, peso, _ in adj[u]:
+            novo_custo = d + peso
+            if novo_custo < dist[v]:
+                dist[v] = novo_custo
+                pred[v] = u
+                heappush(pq, (novo_custo, v))
+
+    return dist, pred
+
+def _iniciar_trabalhador(adj, descritor_dist, descritor_pred):
+    global _ADJ, _DIST, _PRED
+    _ADJ = adj
+    _DIST = ArrayCompartilhado.conectar(descritor_dist)
+    _PRED = ArrayCompartilhado.conectar(descritor_pred)
+
+def _dijkstra_faixa(faixa):
+    """Preenche direto na memória compartilhada as linhas das origens da faixa"""
+    for origem in range(*faixa):
+        dist, pred = dijkstra_indices(_ADJ, origem)
+        _DIST.array[origem] = dist
+        _PRED.array[origem] = pred
+    return faixa
+
+def _matriz_paralela(adj, n, processos):
+    """Roda os Dijkstras em um pool, que escreve as linhas em memória compartilhada"""
+    dist = ArrayCompartilhado((n, n), np.float64)
+    pred = ArrayCompartilhado((n, n), np.int32)
+    try:
+        # Faixas pequenas equilibram a carga entre os processos
+        passo = max(1, n // (processos * 8))
+        faixas = [(i, min(i + passo, n)) for i in range(0, n, passo)]
+        with Pool(processes=processos, initializer=_iniciar_trabalhador,
+                  initargs=(adj, dist.descritor(), pred.descritor())) as pool:
+            for _ in pool.imap_unordered(_dijkstra_faixa, faixas):
+                pass
+        return dist.array.copy(), pred.array.copy()
+    finally:
+        dist.liberar()
+        pred.liberar()
+
+class MatrizDistancias:
+    """Menores caminhos entre todos os pares de vértices de uma instância.
+
+    Roda um Dijkstra por origem uma única vez e guarda as distâncias e os
+    predecessores em matrizes densas, de modo que qualquer consulta
+    posterior é feita em O(1). Com processos > 1 os Dijkstras são divididos
+    entre um pool de processos (fora de workers daemon, que não podem ter
+    filhos).
+    """
+
+    def __init__(self, compacto, processos=1):
+        self.vertices = compacto.vertices
+        self.indice = compacto.indice
+        n = compacto.num_vertices
+        adj = compacto.lista_adjacencia()
+
+        if (processos > 1 and n >= MINIMO_VERTICES_PARALELO
+                and not multiprocessing.current_process().daemon):
+            self.dist, self.pred = _matriz_paralela(adj, n, processos)
+            return
+
+        self.dist = np.full((n, n), INF, dtype=np.float64)
+        self.pred = np.full((n, n), -1, dtype=np.int32)
+        for origem in range(n):
+            dist, pred = dijkstra_indices(adj, origem)
+            self.dist[origem] = dist
+            self.pred[origem] = pred
+
+    @classmethod
+    def de_arrays(cls, vertices, dist, pred=None):
+        """Matriz sobre arrays já calculados (por exemplo, em memória compartilhada)"""
+        matriz = cls.__new__(cls)
+        matriz.vertices = vertices
+        matriz.indice = {v: i for i, v in enumerate(vertices)}
+        matriz.dist = dist
+        matriz.pred = pred
+        return matriz
+
+    def distancia(self, origem, destino):
+        """Distância do menor caminho entre dois rótulos de vértice"""
+        i = self.indice.get(origem)
+        j = self.indice.get(destino)
+        if i is None or j is None:
+            return INF
+        return self.dist[i, j].item()
+
+    def caminho(self, origem, destino):
+        """Sequência de vértices do menor caminho entre origem e destino"""
+        i = self.indice.get(origem)
+        j = self.indice.get(destino)
+        if i is None or j is None or self.dist[i, j] == INF:
+            return []
+        caminho = [j]
+        while j != i:
+            j = int(self.pred[i, j])
+            caminho.append(j)
+        return [self.vertices[k] for k in reversed(caminho)]
+
+def cabe_na_memoria(num_vertices, memoria=None):
+    """Se a matriz densa de num_vertices vértices cabe em 'memoria' bytes (None: sem limite)"""
+    return memoria is None or num_vertices * num_vertices * BYTES_POR_PAR <= memoria
+
+class _LinhasSobDemanda:
+    """Visão indexável [i, j] de um dos campos (dist ou pred) de DistanciasSobDemanda.
+
+    Aceita os mesmos índices que a matriz densa recebe no resto do código:
+    inteiros, arrays de destinos, pares de arrays (elemento a elemento) e
+    np.ix_. Cada origem distinta é buscada uma única vez por consulta.
+    """
+
+    def __init__(self, fonte, campo, dtype):
+        self._fonte = fonte
+        self._campo = campo
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def shape(self):
+        n = self._fonte.num_vertices
+        return n, n
+
+    def __getitem__(self, chave):
+        i, j = chave
+        if np.ndim(i) == 0:
+            return self._fonte.linha(int(i))[self._campo][j]
+        i, j = np.broadcast_arrays(np.asarray(i), np.asarray(j))
+        origens, destinos = i.ravel(), j.ravel()
+        ordem = np.argsort(origens, kind='stable')
+        distintas, inicios = np.unique(origens[ordem], return_index=True)
+        saida = np.empty(origens.shape, dtype=self.dtype)
+        for origem, trecho in zip(distintas, np.split(ordem, inicios[1:])):
+            saida[trecho] = self._fonte.linha(int(origem))[self._campo][destinos[trecho]]
+        return saida.reshape(i.shape)
+
+class DistanciasSobDemanda:
+    """Substituta da MatrizDistancias para instâncias em que n² não cabe na memória.
+
+    Cada linha (as distâncias e predecessores a partir de uma origem) é um
+    Dijkstra sobre a lista de adjacência compacta, calculado na primeira
+    consulta e guardado em um LRU limitado a 'memoria' bytes. Com
+    pasta_espelho, as linhas descartadas vão para um arquivo mapeado em
+    memória e voltam de lá em vez de serem recalculadas. Oferece dist[i, j],
+    pred[i, j], indice, vertices, distancia() e caminho() como a matriz densa.
+    """
+
+    def __init__(self, compacto, memoria, pasta_espelho=None):
+        self.vertices = compacto.vertices
+        self.indice = compacto.indice
+        self.num_vertices = n = compacto.num_vertices
+        self._adj = compacto.lista_adjacencia()
+        self._linhas = OrderedDict()
+        self.max_linhas = max(1, int(memoria // (max(n, 1) * BYTES_POR_PAR)))
+        self.dist = _LinhasSobDemanda(self, 0, np.float64)
+        self.pred = _LinhasSobDemanda(self, 1, np.int32)
+
+        self._espelho = None
+        if pasta_espelho is not None:
+            os.makedirs(pasta_espelho, exist_ok=True)
+            descritor, caminho = tempfile.mkstemp(dir=pasta_espelho, suffix='.dist')
+            try:
+                os.ftruncate(descritor, n * n * BYTES_POR_PAR)
+                os.close(descritor)
+                espelho_dist = np.memmap(caminho, dtype=np.float64, mode='r+', shape=(n, n))
+                espelho_pred = np.memmap(caminho, dtype=np.int32, mode='r+', shape=(n, n),
+                                         offset=n * n * 8)
+            finally:
+                # O mapeamento mantém o arquivo vivo; removido do diretório, some com o processo
+                os.unlink(caminho)
+            self._espelho = (espelho_dist, espelho_pred, np.zeros(n, dtype=bool))
+
+    def linha(self, origem):
+        """(dist, pred) a partir do índice 'origem', do LRU, do espelho ou de um Dijkstra"""
+        linha = self._linhas.get(origem)
+        if linha is not None:
+            self._linhas.move_to_end(origem)
+            contar('distancias.acertos_linha')
+            return linha
+
+        if self._espelho is not None and self._espelho[2][origem]:
+            contar('distancias.linhas_do_espelho')
+            linha = (np.array(self._espelho[0][origem]), np.array(self._espelho[1][origem]))
+        else:
+            contar('distancias.linhas_calculadas')
+            dist, pred = dijkstra_indices(self._adj, origem)
+            linha = (np.array(dist, dtype=np.float64), np.array(pred, dtype=np.int32))
+
+        self._linhas[origem] = linha
+        if len(self._linhas) > self.max_linhas:
+            self._descartar()
+        return linha
+
+    def _descartar(self):
+        """Tira a linha usada há mais tempo do LRU, guardando-a no espelho se houver"""
+        origem, (dist, pred) = self._linhas.popitem(last=False)
+        if self._espelho is not None and not self._espelho[2][origem]:
+            espelho_dist, espelho_pred, no_disco = self._espelho
+            espelho_dist[origem] = dist
+            espelho_pred[origem] = pred
+            no_disco[origem] = True
+
+    distancia = MatrizDistancias.distancia
+    caminho = MatrizDistancias.caminho
+
+@memoizado
+def matriz_distancias(self):
+    """Retorna a matriz de distâncias do grafo, construindo-a na primeira chamada.
+
+    Se a matriz densa passar de self.memoria_distancias bytes, devolve uma
+    DistanciasSobDemanda limitada a esse orçamento.
+    """
+    compacto = self.compactar()
+    if not cabe_na_memoria(compacto.num_vertices, self.memoria_distancias):
+        return DistanciasSobDemanda(compacto, self.memoria_distancias, self.pasta_distancias)
+    return MatrizDistancias(compacto, self.processos)
+
+def definir_matriz_distancias(self, matriz):
+    """Usa uma matriz já calculada (por exemplo, em outro processo) em vez de construí-la"""
+    self._cache['matriz_distancias'] = matriz
@@ -0,0 +1,115 @@
+import math
+import resource
+import threading
+
+# Contagens do cabeçalho do .dat usadas na estimativa de custo
+CAMPOS_CABECALHO = {
+    '#Nodes:': 'nos',
+    '#Edges:': 'arestas',
+    '#Arcs:': 'arcos',
+    '#Required N:': 'nos_req',
+    '#Required E:': 'arestas_req',
+    '#Required A:': 'arcos_req',
+}
+
+def ler_cabecalho(caminho):
+    """Lê só as contagens do cabeçalho da instância, sem percorrer as seções"""
+    contagens = dict.fromkeys(CAMPOS_CABECALHO.values(), 0)
+    with open(caminho, 'r') as file:
+        for line in file:
+            if line.startswith(('ReN.', 'ReE.', 'EDGE', 'ReA.', 'ARC')):
+                break
+            chave, _, valor = line.rpartition(':')
+            campo = CAMPOS_CABECALHO.get(f"{chave.strip()}:")
+            if campo is not None:
+                try:
+                    contagens[campo] = int(valor)
+                except ValueError:
+                    pass
+    return contagens
+
+def estimar_custo(contagens):
+    """Custo relativo esperado de resolver a instância.
+
+    Soma a matriz de distâncias (um Dijkstra por vértice, O(n·m·log n)) e a
+    construção/melhoria, que crescem com o quadrado do número de serviços.
+    Só a ordem entre instâncias importa, não a escala.
+    """
+    n = max(contagens['nos'], 1)
+    m = 2 * contagens['arestas'] + contagens['arcos']
+    servicos = contagens['nos_req'] + contagens['arestas_req'] + contagens['arcos_req']
+    return n * (n + m) * math.log2(n + 1) + servicos ** 2
+
+def ordenar_por_custo(arquivos):
+    """Ordena (nome, caminho) do maior para o menor custo estimado (LPT).
+
+    Começar pelas instâncias mais caras evita que uma delas fique por último
+    com os outros cores ociosos.
+    """
+    custos = {caminho: estimar_custo(ler_cabecalho(caminho)) for _, caminho in arquivos}
+    return sorted(arquivos, key=lambda arquivo: custos[arquivo[1]], reverse=True)
+
+def iniciar_trabalhador(memoria_maxima_mb=None):
+    """Limita o espaço de endereçamento do processo do pool.
+
+    Passando do limite, a alocação falha com MemoryError só na instância que
+    estourou; o processo continua atendendo as próximas.
+    """
+    if memoria_maxima_mb:
+        limite = int(memoria_maxima_mb * 1024 * 1024)
+        _, maximo = resource.getrlimit(resource.RLIMIT_AS)
+        if maximo != resource.RLIM_INFINITY:
+            limite = min(limite, maximo)
+        resource.setrlimit(resource.RLIMIT_AS, (limite, maximo))
+
+class JanelaInstancias:
+    """Limita quantas instâncias ficam publicadas em memória compartilhada ao mesmo tempo.
+
+    O gerador de tarefas (que o pool percorre na sua própria thread) reserva
+    uma vaga antes de publicar uma instância e espera o descritor dela antes
+    de enviar os motores; o processo principal entrega o descritor quando a
+    publicação termina e devolve a vaga quando todos os motores respondem.
+    encerrar() solta quem estiver esperando.
+    """
+
+    def __init__(self, tamanho):
+        self.tamanho = tamanho
+        self.ocupadas = 0
+        self.descritores = {}
+        self.encerrada = False
+        self._condicao = threading.Condition()
+
+    def tem_vaga(self):
+        with self._condicao:
+            return self.ocupadas < self.tamanho
+
+    def reservar(self):
+        """Espera uma vaga e a ocupa; False se a janela foi encerrada"""
+        with self._condicao:
+            self._condicao.wait_for(lambda: self.encerrada or self.ocupadas < self.tamanho)
+            if self.encerrada:
+                return False
+            self.ocupadas += 1
+            return True
+
+    def devolver(self):
+        with self._condicao:
+            self.ocupadas -= 1
+            self._condicao.notify_all()
+
+    def entregar(self, indice, descritor):
+        """Resultado da publicação da instância 'indice' (None se falhou)"""
+        with self._condicao:
+            self.descritores[indice] = descritor
+            self._condicao.notify_all()
+
+    def esperar(self, indice):
+        """Descritor da instância quando publicada; None se falhou ou a janela foi encerrada"""
+        with self._condicao:
+            self._condicao.wait_for(lambda: self.encerrada or indice in self.descritores)
+            return self.descritores.pop(indice, None)
+
+    def encerrar(self):
+        with self._condicao:
+            self.encerrada = True
+            self._condicao.notify_all()
@@ -3,19 +3,24 @@ class Grafo:
         self.vertices = set()
         self.arestas = {}  # {(u,v): [custo, demanda]}
         self.arcos = {}    # {(u,v): [custo, demanda]}
-        self.vertices_req = set()
+        self.vertices_req = {}  # {v: [custo_servico, demanda]}
         self.arestas_req = {}  # {(u,v): [custo, demanda]}
         self.arcos_req = {}    # {(u,v): [custo, demanda]}
         self.adj = {}  # Lista de adjacência para acesso rápido
+        self.deposito = '1'
+        self.processos = 1  # Processos usados nos cálculos paralelos de uma instância
+        self.memoria_distancias = None  # Bytes para a matriz de distâncias (None: matriz densa sempre)
+        self.pasta_distancias = None  # Onde espelhar em disco as linhas de distância descartadas
+        self._cache = {}  # Métricas derivadas, calculadas sob demanda
     
     def add_vertice(self, v):
         self.vertices.add(v)
         if v not in self.adj:
             self.adj[v] = set()
     
-    def add_vertice_req(self, v):
+    def add_vertice_req(self, v, peso=None):
         self.add_vertice(v)
-        self.vertices_req.add(v)
+        self.vertices_req[v] = peso if isinstance(peso, list) else [0, 0]
     
     def add_aresta(self, u, v, peso):
         """Adiciona uma aresta com custo e demanda"""
@@ -95,8 +100,12 @@ class Grafo:
         return f"Grafo com {len(self.vertices)} vértices, {len(self.arestas)} arestas e {len(self.arcos)} arcos"
 
 from grafo_add import add_vertice, add_vertice_req, add_aresta, add_aresta_req, add_arco, add_arco_req
-from grafo_analise import densidade_grafo, calcular_graus, grau_minimo, grau_maximo, floyd_warshall_intermediacao, caminho_medio, diametro, componentes_conectados
+from grafo_analise import densidade_grafo, calcular_graus, grau_minimo, grau_maximo, floyd_warshall, intermediacao, floyd_warshall_intermediacao, caminho_medio, diametro, componentes_conectados
 from grafo_visualizacao import mostra_arestas, mostra_arcos, contar, mostra_intermediacao
+from distancias import matriz_distancias, definir_matriz_distancias
+from matriz_servicos import matriz_servicos
+from grafo_cache import invalidar_cache
+from grafo_compacto import compactar
 
 Grafo.add_vertice = add_vertice
 Grafo.add_vertice_req = add_vertice_req
@@ -109,6 +118,8 @@ Grafo.componentes_conectados = componentes_conectados
 Grafo.calcular_graus = calcular_graus
 Grafo.grau_minimo = grau_minimo
 Grafo.grau_maximo = grau_maximo
+Grafo.floyd_warshall = floyd_warshall
+Grafo.intermediacao = intermediacao
 Grafo.floyd_warshall_intermediacao = floyd_warshall_intermediacao
 Grafo.caminho_medio = caminho_medio
 Grafo.diametro = diametro
@@ -116,6 +127,11 @@ Grafo.mostra_arestas = mostra_arestas
 Grafo.mostra_arcos = mostra_arcos
 Grafo.contar = contar
 Grafo.mostra_intermediacao = mostra_intermediacao
+Grafo.matriz_distancias = matriz_distancias
+Grafo.definir_matriz_distancias = definir_matriz_distancias
+Grafo.matriz_servicos = matriz_servicos
+Grafo.invalidar_cache = invalidar_cache
+Grafo.compactar = compactar
 
 if __name__ == "__main__":
     from .utils_grafo import ler_arquivo_dat
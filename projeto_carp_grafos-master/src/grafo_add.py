@@ -2,29 +2,36 @@ from grafo import Grafo
 
 def add_vertice(self, u):
     self.vertices.add(u)
+    self.invalidar_cache()
 
-def add_vertice_req(self, u):
+def add_vertice_req(self, u, peso=None):
     self.add_vertice(u)
-    self.vertices_req.add(u)
+    self.vertices_req[u] = peso if isinstance(peso, list) else [0, 0]
+    self.invalidar_cache()
 
 def add_aresta(self, u, v, peso):
     self.add_vertice(u)
     self.add_vertice(v)
     aresta = tuple(sorted((u, v)))
     self.arestas[aresta] = peso
+    self.invalidar_cache()
 
 def add_aresta_req(self, u, v, peso):
     self.add_aresta(u, v, peso)
     aresta = tuple(sorted((u, v)))
     self.arestas_req[aresta] = peso
+    self.invalidar_cache()
 
 def add_arco(self, u, v, peso):
     self.add_vertice(u)
     self.add_vertice(v)
     arco = (u, v)
     self.arcos[arco] = peso
+    self.invalidar_cache()
 
 def add_arco_req(self, u, v, peso):
     self.add_arco(u, v, peso)
     arco = (u, v)
-    self.arcos_req[arco] = peso 
\ No newline at end of file
+    self.arcos_req[arco] = peso
+    self.invalidar_cache()
+ 
\ No newline at end of file
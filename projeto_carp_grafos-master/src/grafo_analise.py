@@ -1,3 +1,12 @@
+from heapq import heappush, heappop
+
+import numpy as np
+
+from grafo_cache import memoizado
+from grafo_compacto import ARESTA, ARCO
+
+INF = float('inf')
+
 def densidade_grafo(self):
     V = len(self.vertices)
     if V <= 1:
@@ -6,15 +15,13 @@ def densidade_grafo(self):
     max_conexoes = V * (V - 1)
     return total_conexoes / max_conexoes
 
+@memoizado
 def calcular_graus(self):
-    graus = {v: 0 for v in self.vertices}
-    for (u, v), _ in self.arestas.items():
-        graus[u] += 1
-        graus[v] += 1
-    for (u, v), _ in self.arcos.items():
-        graus[u] += 1  # saída
-        graus[v] += 1  # entrada
-    return graus
+    compacto = self.compactar()
+    # Cada aresta aparece na linha CSR das duas pontas; arcos contam saída e entrada
+    graus = np.diff(compacto.offsets)
+    graus = graus + np.bincount(compacto.destinos[compacto.tipos & ARCO != 0], minlength=compacto.num_vertices)
+    return dict(zip(compacto.vertices, graus.tolist()))
 
 def grau_minimo(self):
     graus = self.calcular_graus()
@@ -24,116 +31,111 @@ def grau_maximo(self):
     graus = self.calcular_graus()
     return max(graus.values()) if graus else 0
 
-def floyd_warshall_intermediacao(self):
-    vertices = sorted(self.vertices)
-    n = len(vertices)
-    idx = {v: i for i, v in enumerate(vertices)}
-    INF = float('inf')
-
-    dist = [[INF] * n for _ in range(n)]
-    pred = [[-1] * n for _ in range(n)]
-
-    for i in range(n):
-        dist[i][i] = 0
-
-    # processa arestas
-    for (u, v), pesos in self.arestas.items():
-        i, j = idx[u], idx[v]
-        peso = min(pesos)
-        if peso < dist[i][j]:
-            dist[i][j] = dist[j][i] = peso
-            pred[i][j] = i
-            pred[j][i] = j
-
-    # processa arestas requeridas
-    for (u, v), peso in self.arestas_req.items():
-        i, j = idx[u], idx[v]
-        if peso < dist[i][j]:
-            dist[i][j] = dist[j][i] = peso
-            pred[i][j] = i
-            pred[j][i] = j
-
-    # processa arcos
-    for (u, v), pesos in self.arcos.items():
-        i, j = idx[u], idx[v]
-        peso = min(pesos)
-        if peso < dist[i][j]:
-            dist[i][j] = peso
-            pred[i][j] = i
-
-    # processa arcos requeridos
-    for (u, v), peso in self.arcos_req.items():
-        i, j = idx[u], idx[v]
-        if peso < dist[i][j]:
-            dist[i][j] = peso
-            pred[i][j] = i
-
-    # Floyd-Warshall
+def _floyd_warshall(n, pesos):
+    """Floyd-Warshall vetorizado: cada passo k é um broadcast de np.minimum"""
+    dist = np.full((n, n), INF, dtype=np.float64)
+    pred = np.full((n, n), -1, dtype=np.int32)
+    np.fill_diagonal(dist, 0)
+    if pesos:
+        origens, destinos = map(np.array, zip(*pesos.keys()))
+        dist[origens, destinos] = list(pesos.values())
+        pred[origens, destinos] = origens
+    np.fill_diagonal(pred, np.arange(n))
+
     for k in range(n):
-        for i in range(n):
-            for j in range(n):
-                if dist[i][k] + dist[k][j] < dist[i][j]:
-                    dist[i][j] = dist[i][k] + dist[k][j]
-                    pred[i][j] = pred[k][j]
-
-    # calculo da intermediação
-    intermed = {v: 0 for v in self.vertices}
+        via_k = dist[:, k, np.newaxis] + dist[np.newaxis, k, :]
+        melhora = via_k < dist
+        np.minimum(dist, via_k, out=dist)
+        pred = np.where(melhora, pred[k][np.newaxis, :], pred)
+    return dist, pred
+
+def _brandes(n, pesos):
+    """Intermediação pelo algoritmo de Brandes (Dijkstra + acúmulo de dependências)"""
+    adj = [[] for _ in range(n)]
+    for (i, j), custo in pesos.items():
+        adj[i].append((j, custo))
+
+    intermed = [0.0] * n
     for s in range(n):
-        for t in range(n):
-            if s == t:
+        pilha = []
+        antecessores = [[] for _ in range(n)]
+        sigma = [0] * n
+        sigma[s] = 1
+        dist = [INF] * n
+        dist[s] = 0
+        pq = [(0, s)]
+        while pq:
+            d, v = heappop(pq)
+            if d > dist[v]:
                 continue
-            caminho = []
-            atual = t
-            while atual != s and atual != -1:
-                caminho.append(atual)
-                atual = pred[s][atual]
-            if atual == s:
-                caminho.append(s)
-                for v in caminho[1:-1]:  # ignora s e t
-                    intermed[vertices[v]] += 1
-
-    return dist, intermed
+            pilha.append(v)
+            for w, custo in adj[v]:
+                novo = d + custo
+                if novo < dist[w]:
+                    dist[w] = novo
+                    sigma[w] = sigma[v]
+                    antecessores[w] = [v]
+                    heappush(pq, (novo, w))
+                elif novo == dist[w]:
+                    sigma[w] += sigma[v]
+                    antecessores[w].append(v)
+
+        delta = [0.0] * n
+        while pilha:
+            w = pilha.pop()
+            for v in antecessores[w]:
+                delta[v] += sigma[v] / sigma[w] * (1 + delta[w])
+            if w != s:
+                intermed[w] += delta[w]
+    return intermed
+
+@memoizado
+def floyd_warshall(self):
+    """Matrizes de distância e predecessores entre todos os pares (ids do GrafoCompacto)"""
+    compacto = self.compactar()
+    return _floyd_warshall(compacto.num_vertices, compacto.menores_pesos())
+
+@memoizado
+def intermediacao(self):
+    """Intermediação de cada vértice"""
+    compacto = self.compactar()
+    intermed = _brandes(compacto.num_vertices, compacto.menores_pesos())
+    return dict(zip(compacto.vertices, intermed))
+
+def floyd_warshall_intermediacao(self):
+    dist, _ = self.floyd_warshall()
+    return dist, self.intermediacao()
 
+@memoizado
 def caminho_medio(self):
-    dist, _ = self.floyd_warshall_intermediacao()
+    dist, _ = self.floyd_warshall()
     n = len(self.vertices)
-    total = 0
     count = n * (n - 1)
-    for i in range(n):
-        for j in range(n):
-            if i != j:
-                total += dist[i][j]
-    return total / count if count > 0 else 0
+    if count == 0:
+        return 0
+    return dist[~np.eye(n, dtype=bool)].sum().item() / count
 
+@memoizado
 def diametro(self):
-    dist, _ = self.floyd_warshall_intermediacao()
-    max_dist = 0
+    dist, _ = self.floyd_warshall()
     n = len(self.vertices)
-    for i in range(n):
-        for j in range(n):
-            if i != j and dist[i][j] != float('inf'):
-                max_dist = max(max_dist, dist[i][j])
-    return max_dist 
+    alcancaveis = dist[~np.eye(n, dtype=bool) & np.isfinite(dist)]
+    return alcancaveis.max().item() if alcancaveis.size else 0
 
+@memoizado
 def componentes_conectados(self):
-    visitados = set()
+    # Considera apenas as arestas, como na versão baseada em dicionários
+    adj = self.compactar().lista_adjacencia(ARESTA)
+    visitados = [False] * len(adj)
     componentes = 0
 
-    vizinhos = {v: set() for v in self.vertices}
-    for (u, v), _ in self.arestas.items():
-        vizinhos[u].add(v)
-        vizinhos[v].add(u)
-    for (u, v), _ in self.arestas_req.items():
-        vizinhos[u].add(v)
-        vizinhos[v].add(u)
-
-    for v in self.vertices:
-        if v not in visitados:
+    for v in range(len(adj)):
+        if not visitados[v]:
             componentes += 1
             pilha = [v]
             while pilha:
                 atual = pilha.pop()
-                if atual not in visitados:
-                    visitados.add(atual)
-                    pilha.extend(n for n in vizinhos[atual] if n not in visitados)
+                if not visitados[atual]:
+                    visitados[atual] = True
+                    pilha.extend(w for w, _, _ in adj[atual] if not visitados[w])
     return componentes
\ No newline at end of file
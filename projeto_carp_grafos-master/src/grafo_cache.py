@@ -0,0 +1,29 @@
+import time
+from functools import wraps
+
+from instrumentacao import contar, registrar_tempo
+
+def memoizado(funcao):
+    """Guarda o resultado de uma métrica no cache do grafo.
+
+    O valor é calculado na primeira chamada e reaproveitado até que o grafo
+    seja modificado (ver invalidar_cache). O resultado é compartilhado entre
+    as chamadas, então não deve ser alterado por quem o recebe. Com a
+    instrumentação ligada, os acertos do cache são contados e o cálculo é
+    cronometrado.
+    """
+    @wraps(funcao)
+    def metrica(self):
+        nome = funcao.__name__
+        if nome not in self._cache:
+            inicio = time.perf_counter()
+            self._cache[nome] = funcao(self)
+            registrar_tempo(nome, time.perf_counter() - inicio)
+        else:
+            contar(f"{nome}.acertos_cache")
+        return self._cache[nome]
+    return metrica
+
+def invalidar_cache(self):
+    """Descarta todas as métricas calculadas após uma modificação do grafo"""
+    self._cache.clear()
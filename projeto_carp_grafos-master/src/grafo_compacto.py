@@ -0,0 +1,133 @@
+import numpy as np
+
+from grafo_cache import memoizado
+
+# Flags de tipo de cada entrada da adjacência
+ARESTA = 1
+ARCO = 2
+REQUERIDO = 4
+
+def chave_vertice(v):
+    """Ordena rótulos numéricos pelo valor e os demais em ordem alfabética"""
+    return (0, int(v), v) if str(v).isdigit() else (1, 0, str(v))
+
+def _congelar(array):
+    array.flags.writeable = False
+    return array
+
+class GrafoCompacto:
+    """Forma compacta e imutável de um Grafo.
+
+    Os rótulos dos vértices são mapeados para ids inteiros densos e a
+    adjacência é guardada em formato CSR: as entradas saindo do vértice i
+    ocupam as posições offsets[i]:offsets[i+1] dos vetores destinos, custos,
+    demandas e tipos. Cada aresta aparece nos dois sentidos; cada arco, só
+    no seu.
+    """
+
+    __slots__ = ('vertices', 'indice', 'offsets', 'destinos', 'custos',
+                 'demandas', 'tipos', 'requeridos', '_adjacencia')
+
+    def __init__(self, vertices, offsets, destinos, custos, demandas, tipos, requeridos):
+        self.vertices = vertices
+        self.indice = {v: i for i, v in enumerate(vertices)}
+        self.offsets = _congelar(offsets)
+        self.destinos = _congelar(destinos)
+        self.custos = _congelar(custos)
+        self.demandas = _congelar(demandas)
+        self.tipos = _congelar(tipos)
+        self.requeridos = _congelar(requeridos)
+        self._adjacencia = None
+
+    @classmethod
+    def de_grafo(cls, grafo):
+        vertices = sorted(grafo.vertices, key=chave_vertice)
+        indice = {v: i for i, v in enumerate(vertices)}
+
+        origens, destinos, custos, demandas, tipos = [], [], [], [], []
+        for (u, v), peso in grafo.arestas.items():
+            custo, demanda = peso if isinstance(peso, list) else (peso, 0)
+            tipo = ARESTA | (REQUERIDO if (u, v) in grafo.arestas_req else 0)
+            i, j = indice[u], indice[v]
+            origens += [i, j]
+            destinos += [j, i]
+            custos += [custo, custo]
+            demandas += [demanda, demanda]
+            tipos += [tipo, tipo]
+        for (u, v), peso in grafo.arcos.items():
+            custo, demanda = peso if isinstance(peso, list) else (peso, 0)
+            origens.append(indice[u])
+            destinos.append(indice[v])
+            custos.append(custo)
+            demandas.append(demanda)
+            tipos.append(ARCO | (REQUERIDO if (u, v) in grafo.arcos_req else 0))
+
+        n = len(vertices)
+        origens = np.array(origens, dtype=np.int32)
+        destinos = np.array(destinos, dtype=np.int32)
+        ordem = np.lexsort((destinos, origens))
+        offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(origens, minlength=n), out=offsets[1:])
+
+        requeridos = np.zeros(n, dtype=bool)
+        requeridos[[indice[v] for v in grafo.vertices_req]] = True
+
+        return cls(
+            vertices,
+            offsets,
+            destinos[ordem],
+            np.array(custos, dtype=np.int64)[ordem],
+            np.array(demandas, dtype=np.int64)[ordem],
+            np.array(tipos, dtype=np.int8)[ordem],
+            requeridos,
+        )
+
+    @property
+    def num_vertices(self):
+        return len(self.vertices)
+
+    def origens(self):
+        """Vértice de origem de cada entrada da adjacência"""
+        return np.repeat(np.arange(self.num_vertices, dtype=np.int32), np.diff(self.offsets))
+
+    def lista_adjacencia(self, tipos=ARESTA | ARCO):
+        """Lista de listas (destino, custo, tipo) para laços em Python puro"""
+        if tipos == ARESTA | ARCO and self._adjacencia is not None:
+            return self._adjacencia
+        offsets = self.offsets.tolist()
+        destinos = self.destinos.tolist()
+        custos = self.custos.tolist()
+        flags = self.tipos.tolist()
+        adj = [
+            [(destinos[k], custos[k], flags[k]) for k in range(offsets[i], offsets[i + 1]) if flags[k] & tipos]
+            for i in range(self.num_vertices)
+        ]
+        if tipos == ARESTA | ARCO:
+            self._adjacencia = adj
+        return adj
+
+    def menores_pesos(self):
+        """Menor custo de cada par (i, j) ligado diretamente, ignorando paralelos"""
+        pesos = {}
+        for i, j, custo in zip(self.origens().tolist(), self.destinos.tolist(), self.custos.tolist()):
+            if custo < pesos.get((i, j), float('inf')):
+                pesos[(i, j)] = custo
+        return pesos
+
+    def custo(self, u, v):
+        """Menor custo de uma entrada direta de u para v, ou None"""
+        i, j = self.indice.get(u), self.indice.get(v)
+        if i is None or j is None:
+            return None
+        inicio, fim = self.offsets[i], self.offsets[i + 1]
+        k = inicio + np.searchsorted(self.destinos[inicio:fim], j)
+        if k == fim or self.destinos[k] != j:
+            return None
+        # Entradas paralelas ficam adjacentes por causa da ordenação
+        fim_paralelas = inicio + np.searchsorted(self.destinos[inicio:fim], j, side='right')
+        return self.custos[k:fim_paralelas].min().item()
+
+@memoizado
+def compactar(self):
+    """Retorna a forma compacta (CSR) do grafo"""
+    return GrafoCompacto.de_grafo(self)
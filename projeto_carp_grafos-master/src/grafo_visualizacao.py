@@ -30,7 +30,7 @@ def contar(self):
     print(f"Diâmetro: {self.diametro()}")
 
 def mostra_intermediacao(self):
-    _, intermed = self.floyd_warshall_intermediacao()
+    intermed = self.intermediacao()
     print("\nIntermediação:")
     for no, score in sorted(intermed.items()):
-        print(f"Nó {no}: {score}") 
\ No newline at end of file
+        print(f"Nó {no}: {score:.2f}") 
\ No newline at end of file
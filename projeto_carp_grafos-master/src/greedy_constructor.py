@@ -1,54 +1,42 @@
 import os
 import sys
-from heapq import heappush, heappop
-from collections import defaultdict
-from functools import lru_cache
+import multiprocessing
+from multiprocessing import Pool
 
-def criar_lista_adjacencia(grafo):
-    # Cria lista de adjacência para acessar vizinhos mais rapidamente
-    adj = defaultdict(list)
-    # Pré-calcula todos os vizinhos de uma vez
-    for (u, v), peso in grafo.arestas.items():
-        if isinstance(peso, list):
-            peso = peso[0]
-        adj[u].append((v, peso))
-        adj[v].append((u, peso))  # Arestas são bidirecionais
-    for (u, v), peso in grafo.arcos.items():
-        if isinstance(peso, list):
-            peso = peso[0]
-        adj[u].append((v, peso))
-    return adj
+import numpy as np
 
+from distancias import dijkstra_indices, MatrizDistancias
+from grafo_compacto import ARESTA
+from memoria_compartilhada import ArrayCompartilhado
+from instrumentacao import medido, contar
+from rota import Rota
+
+# Abaixo disso, a comunicação com o pool custa mais que a avaliação das inserções.
+# Com a avaliação vetorizada, uma chamada custa em média ~1 ms mesmo com 833
+# serviços (a maior instância do conjunto), o mesmo que a ida e volta ao pool
+MINIMO_SERVICOS_PARALELO = 2000
+
+# Estado de cada processo do pool de InsercaoParalela (ver _iniciar_avaliacao)
+_AVALIACAO = None
+
+@medido()
 def dijkstra(grafo, origem, destino=None):
     """Implementa Dijkstra para encontrar caminhos mais curtos"""
-    dist = {v: float('inf') for v in grafo.vertices}
-    dist[origem] = 0
-    prev = {v: None for v in grafo.vertices}
-    pq = [(0, origem)]
-    visitados = set()
-    
-    # Cria lista de adjacência local
-    adj = criar_lista_adjacencia(grafo)
+    compacto = grafo.compactar()
+    adj = compacto.lista_adjacencia()
+    dist_idx, pred_idx = dijkstra_indices(adj, compacto.indice[origem], compacto.indice.get(destino))
 
-    while pq:
-        d, u = heappop(pq)
-        
-        if u in visitados:
-            continue
-            
-        visitados.add(u)
-        
-        if destino and u == destino:
-            break
-            
-        # Verifica vizinhos
-        for v, peso in adj[u]:
-            if v not in visitados:
-                novo_custo = d + peso
-                if novo_custo < dist[v]:
-                    dist[v] = novo_custo
-                    prev[v] = (u, 'aresta' if (u, v) in grafo.arestas or (v, u) in grafo.arestas else 'arco')
-                    heappush(pq, (dist[v], v))
+    dist = {}
+    prev = {}
+    for i, v in enumerate(compacto.vertices):
+        dist[v] = dist_idx[i]
+        anterior = pred_idx[i]
+        if anterior == -1:
+            prev[v] = None
+        else:
+            # Tipo da entrada usada para chegar em v
+            _, tipo = min((custo, t) for j, custo, t in adj[anterior] if j == i)
+            prev[v] = (compacto.vertices[anterior], 'aresta' if tipo & ARESTA else 'arco')
     
     return dist, prev
 
@@ -57,6 +45,7 @@ def reconstruir_caminho(prev, origem, destino, grafo):
     if destino not in prev or prev[destino] is None:
         return [], float('inf')
         
+    compacto = grafo.compactar()
     caminho = []
     custo = 0
     atual = destino
@@ -65,177 +54,257 @@ def reconstruir_caminho(prev, origem, destino, grafo):
         anterior, tipo = prev[atual]
         caminho.append((anterior, atual, tipo))
         # Adiciona custo do deslocamento
-        if tipo == 'aresta':
-            peso = grafo.get_peso(anterior, atual)
-            if isinstance(peso, list):
-                peso = peso[0]
-            custo += peso
-        else:  # arco
-            peso = grafo.get_peso(anterior, atual)
-            if isinstance(peso, list):
-                peso = peso[0]
-            custo += peso
+        custo += compacto.custo(anterior, atual)
         atual = anterior
         
     return list(reversed(caminho)), custo
 
-@lru_cache(maxsize=1024)
-def calcular_distancia_entre_vertices(grafo, origem, destino, deposito):
-    """Calcula e armazena em cache a distância entre dois vértices"""
-    dist, prev = dijkstra(grafo, origem)
-    if destino not in dist:
-        return float('inf'), None
-    return dist[destino], prev
+@medido()
+def calcular_distancia_entre_vertices(grafo, origem, destino, deposito=None):
+    """Consulta em O(1) a distância entre dois vértices na matriz pré-calculada"""
+    return grafo.matriz_distancias().distancia(origem, destino)
 
-def calcular_custo_rota(rota, grafo, deposito):
-    """Calcula o custo total de uma rota considerando todos os custos"""
+def orientacoes(servico):
+    """Pares (início, fim) em que o serviço pode ser atendido"""
+    if servico['tipo'] == 'aresta' and servico['u'] != servico['v']:
+        return ((servico['u'], servico['v']), (servico['v'], servico['u']))
+    return ((servico['u'], servico['v']),)
+
+@medido()
+def orientar_rota(rota, grafo, deposito):
+    """Escolhe a melhor direção de cada aresta para uma sequência fixa de serviços.
+
+    Programação dinâmica em O(len(rota)): para cada serviço guarda o menor custo
+    de chegar ao fim dele em cada orientação possível (uma para arcos, duas para
+    arestas). Retorna a rota com as arestas orientadas e o custo total.
+    """
     if not rota:
-        return 0
+        return [], 0
     
-    custo_total = 0
+    distancia = grafo.matriz_distancias().distancia
+    custos = [0]
+    pontos = [deposito]
+    escolhas = []
     
-    # Custo para ir do depósito ao primeiro serviço
-    primeiro_servico = rota[0]
-    dist_inicial, prev_inicial = calcular_distancia_entre_vertices(grafo, deposito, primeiro_servico['u'], deposito)
-    if dist_inicial == float('inf'):
-        return float('inf')
-    custo_total += dist_inicial
+    for servico in rota:
+        opcoes = orientacoes(servico)
+        novos_custos = []
+        origens = []
+        for inicio, _ in opcoes:
+            anterior = min(range(len(custos)), key=lambda k: custos[k] + distancia(pontos[k], inicio))
+            novos_custos.append(custos[anterior] + distancia(pontos[anterior], inicio) + servico['custo'])
+            origens.append(anterior)
+        escolhas.append((opcoes, origens))
+        custos = novos_custos
+        pontos = [fim for _, fim in opcoes]
     
-    # Custo dos serviços e deslocamentos entre eles
-    for i, servico in enumerate(rota):
-        # Adiciona custo do serviço
-        if servico['tipo'] == 'aresta':
-            # Para arestas, podemos atender em qualquer direção
-            custo_total += servico['custo']
-        else:  # arco
-            # Para arcos, precisamos respeitar a direção
-            if not grafo.tem_arco(servico['u'], servico['v']):
-                return float('inf')  # Caminho impossível
-            custo_total += servico['custo']
-        
-        # Se não é o último serviço, adiciona custo até o próximo
-        if i < len(rota) - 1:
-            proximo = rota[i + 1]
-            dist, _ = calcular_distancia_entre_vertices(grafo, servico['v'], proximo['u'], deposito)
-            if dist == float('inf'):
-                return float('inf')
-            custo_total += dist
+    # Volta ao depósito e reconstrói as orientações escolhidas
+    k = min(range(len(custos)), key=lambda k: custos[k] + distancia(pontos[k], deposito))
+    custo_total = custos[k] + distancia(pontos[k], deposito)
     
-    # Custo para voltar ao depósito do último serviço
-    ultimo_servico = rota[-1]
-    dist_final, _ = calcular_distancia_entre_vertices(grafo, ultimo_servico['v'], deposito, deposito)
-    if dist_final == float('inf'):
-        return float('inf')
-    custo_total += dist_final
+    rota_orientada = []
+    for servico, (opcoes, origens) in zip(reversed(rota), reversed(escolhas)):
+        inicio, fim = opcoes[k]
+        if (inicio, fim) == (servico['u'], servico['v']):
+            rota_orientada.append(servico)
+        else:
+            rota_orientada.append(dict(servico, u=inicio, v=fim))
+        k = origens[k]
+    rota_orientada.reverse()
     
-    return custo_total
+    return rota_orientada, custo_total
+
+def orientar(servico, inicio, fim):
+    """Serviço atendido de inicio para fim (cópia apenas se a direção mudar)"""
+    if (servico['u'], servico['v']) == (inicio, fim):
+        return servico
+    return dict(servico, u=inicio, v=fim)
+
+@medido()
+def calcular_custo_rota(rota, grafo, deposito):
+    """Calcula o custo total de uma rota, com cada aresta na sua melhor direção"""
+    return orientar_rota(rota, grafo, deposito)[1]
 
 def encontrar_servicos_proximos(servico, servicos_disponiveis, grafo, max_dist=float('inf')):
     """Encontra serviços próximos que podem ser atendidos em conjunto"""
-    proximos = []
+    # Distância do fim do serviço ao início de cada candidato, na melhor orientação
+    proximos = grafo.matriz_servicos().mais_proximos(servico, servicos_disponiveis)
+    return [(s, dist) for s, dist in proximos if dist <= max_dist]
+
+def _candidatos(servicos_disponiveis, indice, carga_atual, capacidade):
+    """Uma entrada por (serviço, orientação) que cabe na rota, na ordem de avaliação.
+
+    Devolve (servicos, inicios, fins, custos, demandas), com o dict do serviço
+    e os índices de vértice de cada orientação.
+    """
+    servicos, inicios, fins, custos, demandas = [], [], [], [], []
     for s in servicos_disponiveis:
-        if s == servico:
+        if carga_atual + s['demanda'] > capacidade:
             continue
-        # Calcula distância entre o fim do serviço atual e início do próximo
-        dist, _ = calcular_distancia_entre_vertices(grafo, servico['v'], s['u'], None)
-        if dist != float('inf'):
-            proximos.append((s, dist))
-    return sorted(proximos, key=lambda x: x[1])
+        for inicio, fim in orientacoes(s):
+            servicos.append((s, inicio, fim))
+            inicios.append(indice[inicio])
+            fins.append(indice[fim])
+            custos.append(s['custo'])
+            demandas.append(s['demanda'])
+    return (servicos, np.array(inicios, dtype=np.int64), np.array(fins, dtype=np.int64),
+            np.array(custos, dtype=np.float64), np.array(demandas, dtype=np.float64))
+
+@medido()
+def encontrar_melhor_insercao(servicos_disponiveis, rota_atual, grafo, deposito, capacidade, carga_atual=None, matriz=None):
+    """Encontra a melhor posição para inserir um novo serviço na rota.
 
-def encontrar_melhor_insercao(servicos_disponiveis, rota_atual, grafo, deposito, capacidade):
-    """Encontra a melhor posição para inserir um novo serviço na rota"""
-    melhor_servico = None
-    melhor_posicao = None
-    menor_custo_adicional = float('inf')
+    Todas as inserções (serviço, orientação, posição) são avaliadas de uma
+    vez: os custos formam uma matriz candidatos × posições montada por
+    indexação na matriz de distâncias, e um único argmin escolhe a primeira de
+    menor custo, na mesma ordem da avaliação um a um.
+    """
+    if carga_atual is None:
+        carga_atual = rota_atual.carga if isinstance(rota_atual, Rota) else sum(s['demanda'] for s in rota_atual)
+    if matriz is None:
+        matriz = grafo.matriz_distancias()
+    dist, indice = matriz.dist, matriz.indice
+    dep = indice[deposito]
     
-    carga_atual = sum(s['demanda'] for s in rota_atual)
+    candidatos, inicios_s, fins_s, custos_s, demandas_s = _candidatos(
+        servicos_disponiveis, indice, carga_atual, capacidade)
+    if not candidatos:
+        return None, None, float('inf')
     
-    # Se a rota está vazia, escolhe o serviço mais próximo do depósito
     if not rota_atual:
-        dist_deposito, prev_deposito = dijkstra(grafo, deposito)
-        for s in servicos_disponiveis:
-            if s['demanda'] > capacidade:
-                continue
-                
-            # Para arcos, verifica se é possível atender na direção correta
-            if s['tipo'] == 'arco' and not grafo.tem_arco(s['u'], s['v']):
-                continue
-                
-            # Calcula custo total (ida + serviço + volta)
-            dist_ida = dist_deposito[s['u']]
-            if dist_ida == float('inf'):
-                continue
-                
-            dist_volta, _ = calcular_distancia_entre_vertices(grafo, s['v'], deposito, deposito)
-            if dist_volta == float('inf'):
-                continue
-                
-            custo_total = dist_ida + s['custo'] + dist_volta
-            if custo_total < menor_custo_adicional:
-                menor_custo_adicional = custo_total
-                melhor_servico = [s]
-                melhor_posicao = 0
-                
-        return melhor_servico, melhor_posicao, menor_custo_adicional
-    
-    # Para rota não vazia, tenta inserir em cada posição
-    custo_atual = calcular_custo_rota(rota_atual, grafo, deposito)
-    
-    for s in servicos_disponiveis:
-        # Verifica capacidade
-        if carga_atual + s['demanda'] > capacidade:
-            continue
-            
-        # Para arcos, verifica se é possível atender na direção correta
-        if s['tipo'] == 'arco' and not grafo.tem_arco(s['u'], s['v']):
-            continue
-            
-        # Tenta inserir em cada posição da rota
-        for i in range(len(rota_atual) + 1):
-            nova_rota = rota_atual[:i] + [s] + rota_atual[i:]
-            novo_custo = calcular_custo_rota(nova_rota, grafo, deposito)
-            
-            if novo_custo == float('inf'):
-                continue  # Inserção impossível nesta posição
-                
-            custo_adicional = novo_custo - custo_atual
-            
-            # Favorece inserções que maximizam o uso da capacidade
-            fator_capacidade = (carga_atual + s['demanda']) / capacidade
-            custo_ajustado = custo_adicional * (1 - fator_capacidade * 0.1)
-            
-            if custo_ajustado < menor_custo_adicional:
-                menor_custo_adicional = custo_ajustado
-                melhor_servico = [s]
-                melhor_posicao = i
+        # Rota vazia: ida + serviço + volta na direção mais barata
+        contar('avaliacoes_insercao', len(candidatos))
+        custos = dist[dep, inicios_s] + custos_s + dist[fins_s, dep]
+    else:
+        # O custo de inserir s entre anterior e próximo é o delta
+        # d(anterior.v, s.u) + custo(s) + d(s.v, próximo.u) - d(anterior.v, próximo.u);
+        # a posição i fica entre o fim do serviço i-1 (ou depósito) e o início do serviço i (ou depósito)
+        if isinstance(rota_atual, Rota):
+            fins, inicios = rota_atual.ligacoes()
+        else:
+            fins = np.array([dep] + [indice[r['v']] for r in rota_atual])
+            inicios = np.array([indice[r['u']] for r in rota_atual] + [dep])
+        contar('avaliacoes_insercao', len(candidatos) * len(fins))
+        ate_servico = dist[np.ix_(fins, inicios_s)].T
+        apos_servico = dist[np.ix_(fins_s, inicios)]
+        with np.errstate(invalid='ignore'):
+            custos = ate_servico + custos_s[:, None] + apos_servico - dist[fins, inicios]
+        # Favorece inserções que maximizam o uso da capacidade
+        fator_capacidade = (carga_atual + demandas_s) / capacidade
+        custos = custos * (1 - fator_capacidade * 0.1)[:, None]
+        # Posições inalcançáveis ficam de fora
+        custos[~(np.isfinite(ate_servico) & np.isfinite(apos_servico))] = np.inf
     
-    return melhor_servico, melhor_posicao, menor_custo_adicional
+    melhor = int(np.argmin(custos))
+    custo = custos.flat[melhor].item()
+    if custo == float('inf'):
+        return None, None, float('inf')
+    candidato, posicao = divmod(melhor, custos.shape[1]) if custos.ndim == 2 else (melhor, 0)
+    s, inicio, fim = candidatos[candidato]
+    return [orientar(s, inicio, fim)], posicao, custo
 
-def greedy_constructor(grafo, capacidade, deposito='1'):
-    """Constrói uma solução usando estratégia gulosa melhorada"""
-    rotas = []
+def _iniciar_avaliacao(vertices, descritor_dist, servicos, deposito, capacidade):
+    global _AVALIACAO
+    dist = ArrayCompartilhado.conectar(descritor_dist)
+    _AVALIACAO = {
+        'dist': dist,  # mantém o bloco aberto enquanto o processo viver
+        'matriz': MatrizDistancias.de_arrays(vertices, dist.array),
+        'servicos': {s['id']: s for s in servicos},
+        'deposito': deposito,
+        'capacidade': capacidade,
+    }
+
+def _avaliar_fatia(tarefa):
+    ids, rota_atual, carga_atual = tarefa
+    servicos = _AVALIACAO['servicos']
+    return encontrar_melhor_insercao(
+        [servicos[i] for i in ids], rota_atual, None, _AVALIACAO['deposito'],
+        _AVALIACAO['capacidade'], carga_atual, _AVALIACAO['matriz']
+    )
+
+class InsercaoParalela:
+    """Divide a avaliação de encontrar_melhor_insercao entre processos.
+
+    A matriz de distâncias vai uma única vez para memória compartilhada e os
+    serviços são enviados na criação do pool. A cada chamada só a rota atual e
+    os ids dos serviços disponíveis trafegam; cada processo devolve a melhor
+    inserção da sua fatia, e a primeira de menor custo vence, como na versão
+    sequencial.
+    """
+
+    def __init__(self, grafo, servicos, deposito, capacidade, processos):
+        matriz = grafo.matriz_distancias()
+        self.processos = processos
+        self._dist = ArrayCompartilhado.copiar(matriz.dist)
+        try:
+            self._pool = Pool(processes=processos, initializer=_iniciar_avaliacao,
+                              initargs=(matriz.vertices, self._dist.descritor(), servicos, deposito, capacidade))
+        except Exception:
+            self._dist.liberar()
+            raise
+
+    def melhor_insercao(self, servicos_disponiveis, rota_atual, carga_atual):
+        ids = [s['id'] for s in servicos_disponiveis]
+        tamanho = -(-len(ids) // self.processos)
+        # Só os dicts da rota trafegam; cada processo recalcula as pontas
+        rota_atual = list(rota_atual)
+        fatias = [(ids[i:i + tamanho], rota_atual, carga_atual) for i in range(0, len(ids), tamanho)]
+        melhor = (None, None, float('inf'))
+        for resultado in self._pool.map(_avaliar_fatia, fatias):
+            if resultado[2] < melhor[2]:
+                melhor = resultado
+        return melhor
+
+    def fechar(self):
+        self._pool.close()
+        self._pool.join()
+        self._dist.liberar()
+
+def coletar_servicos(grafo):
+    """Lista os serviços requeridos (nós, arestas e arcos com demanda).
+
+    O id segue a numeração do arquivo .dat usada na saída: primeiro os nós
+    requeridos, depois as arestas e por fim os arcos, contando também os
+    itens sem demanda.
+    """
     servicos = []
+    proximo_id = 1
     
-    # Coleta todos os serviços (arestas e arcos requeridos)
-    for (u, v), peso in grafo.arestas_req.items():  # Mudança: usa arestas_req em vez de arestas
-        if isinstance(peso, list) and len(peso) > 1 and peso[1] > 0:  # Aresta requerida
+    # Nós requeridos: atendidos ao passar pelo nó, sem custo de travessia
+    # (assim como as ligações usam o T. COST e não o S. COST)
+    for v, (_, demanda) in grafo.vertices_req.items():
+        if demanda > 0:
             servicos.append({
-                'u': u,
+                'id': proximo_id,
+                'u': v,
                 'v': v,
-                'tipo': 'aresta',
-                'custo': peso[0],
-                'demanda': peso[1]
+                'tipo': 'no',
+                'custo': 0,
+                'demanda': demanda
             })
+        proximo_id += 1
     
-    for (u, v), peso in grafo.arcos_req.items():  # Mudança: usa arcos_req em vez de arcos
-        if isinstance(peso, list) and len(peso) > 1 and peso[1] > 0:  # Arco requerido
-            servicos.append({
-                'u': u,
-                'v': v,
-                'tipo': 'arco',
-                'custo': peso[0],
-                'demanda': peso[1]
-            })
+    # Arestas e arcos requeridos
+    for requeridos, tipo in ((grafo.arestas_req, 'aresta'), (grafo.arcos_req, 'arco')):
+        for (u, v), peso in requeridos.items():
+            if isinstance(peso, list) and len(peso) > 1 and peso[1] > 0:
+                servicos.append({
+                    'id': proximo_id,
+                    'u': u,
+                    'v': v,
+                    'tipo': tipo,
+                    'custo': peso[0],
+                    'demanda': peso[1]
+                })
+            proximo_id += 1
+    
+    return servicos
+
+@medido()
+def greedy_constructor(grafo, capacidade, deposito='1'):
+    """Constrói uma solução usando estratégia gulosa melhorada"""
+    rotas = []
+    servicos = coletar_servicos(grafo)
     
     # Se não há serviços para atender, retorna lista vazia
     if not servicos:
@@ -245,33 +314,55 @@ def greedy_constructor(grafo, capacidade, deposito='1'):
     # Ordena serviços por demanda (decrescente) para tentar maximizar uso da capacidade
     servicos.sort(key=lambda x: x['demanda'], reverse=True)
     
-    servicos_restantes = servicos.copy()
-    rota_atual = []
-    carga_atual = 0
+    # Dict por id: remoção em O(1) mantendo a ordem de avaliação
+    servicos_restantes = {s['id']: s for s in servicos}
+    matriz = grafo.matriz_distancias()
+    rota_atual = Rota(matriz, deposito)
     
-    while servicos_restantes:
-        # Encontra melhor serviço para inserir
-        servicos_inserir, posicao, custo = encontrar_melhor_insercao(
-            servicos_restantes, rota_atual, grafo, deposito, capacidade
-        )
-        
-        # Se não encontrou serviço válido ou rota atual está cheia
-        if not servicos_inserir or carga_atual + sum(s['demanda'] for s in servicos_inserir) > capacidade:
-            if rota_atual:
-                rotas.append(rota_atual)
-            rota_atual = []
-            carga_atual = 0
-            continue
-        
-        # Insere serviços na rota
-        for s in servicos_inserir:
-            rota_atual = rota_atual[:posicao] + [s] + rota_atual[posicao:]
-            servicos_restantes.remove(s)
-            carga_atual += s['demanda']
-            posicao += 1
+    # Em instâncias grandes, com grafo.processos > 1, as inserções são avaliadas em paralelo
+    paralelo = None
+    # (só com a matriz densa, que é a que vai para memória compartilhada)
+    if (grafo.processos > 1 and len(servicos) >= MINIMO_SERVICOS_PARALELO
+            and not multiprocessing.current_process().daemon
+            and isinstance(matriz, MatrizDistancias)):
+        paralelo = InsercaoParalela(grafo, servicos, deposito, capacidade, grafo.processos)
+    
+    try:
+        while servicos_restantes:
+            # Encontra melhor serviço para inserir
+            disponiveis = list(servicos_restantes.values())
+            if paralelo:
+                servicos_inserir, posicao, custo = paralelo.melhor_insercao(
+                    disponiveis, rota_atual, rota_atual.carga
+                )
+            else:
+                servicos_inserir, posicao, custo = encontrar_melhor_insercao(
+                    disponiveis, rota_atual, grafo, deposito, capacidade, rota_atual.carga, matriz
+                )
+            
+            # Se não encontrou serviço válido ou rota atual está cheia
+            if not servicos_inserir or rota_atual.carga + sum(s['demanda'] for s in servicos_inserir) > capacidade:
+                if rota_atual:
+                    rotas.append(rota_atual)
+                rota_atual = Rota(matriz, deposito)
+                continue
+            
+            # Insere serviços na rota
+            for s in servicos_inserir:
+                rota_atual.inserir(posicao, s)
+                # s pode ser uma cópia com a direção trocada, então remove pelo id
+                del servicos_restantes[s['id']]
+                posicao += 1
+    finally:
+        if paralelo:
+            paralelo.fechar()
     
     # Adiciona última rota se não estiver vazia
     if rota_atual:
         rotas.append(rota_atual)
     
+    # Cada aresta na melhor direção para a sequência construída
+    for rota in rotas:
+        rota.reconstruir(orientar_rota(rota, grafo, deposito)[0])
+    
     return rotas 
\ No newline at end of file
@@ -0,0 +1,93 @@
+from distancias import MatrizDistancias, cabe_na_memoria
+from memoria_compartilhada import ArrayCompartilhado
+from utils_grafo import ler_dados_instancia, montar_grafo
+
+# Arrays da leitura (ver ler_instancia) e da matriz de distâncias
+CAMPOS_DADOS = ('cabecalho', 'nos_req', 'ligacoes')
+CAMPOS_MATRIZ = ('dist', 'pred')
+
+class InstanciaCompartilhada:
+    """Uma instância lida e sua matriz de distâncias em memória compartilhada.
+
+    Um processo lê o arquivo e calcula a matriz uma única vez com publicar()
+    e pode entregar() os blocos a outro, que os remove no fim; os workers
+    recebem só o descritor e remontam o grafo sobre visões dos mesmos
+    buffers, sem reler o arquivo nem refazer os Dijkstras.
+    Se a matriz densa não couber em memoria_distancias bytes, só a leitura é
+    compartilhada e cada worker calcula as suas linhas sob demanda.
+    """
+
+    def __init__(self, blocos, vertices, dono):
+        self.blocos = blocos
+        self.vertices = vertices
+        self.dono = dono
+        self._grafos = []
+
+    @classmethod
+    def publicar(cls, caminho, pasta_cache=None, processos=1, memoria_distancias=None):
+        dados = ler_dados_instancia(caminho, pasta_cache)
+        grafo, _ = montar_grafo(dados)
+        grafo.processos = processos
+        vertices = grafo.compactar().vertices
+        campos = CAMPOS_DADOS
+        arrays = dict(dados)
+        if cabe_na_memoria(len(vertices), memoria_distancias):
+            matriz = grafo.matriz_distancias()
+            campos += CAMPOS_MATRIZ
+            arrays.update(dist=matriz.dist, pred=matriz.pred)
+
+        blocos = {}
+        try:
+            for campo in campos:
+                blocos[campo] = ArrayCompartilhado.copiar(arrays[campo])
+        except Exception:
+            for bloco in blocos.values():
+                bloco.liberar()
+            raise
+        return cls(blocos, vertices, dono=True)
+
+    @classmethod
+    def conectar(cls, descritor, dono=False):
+        blocos = {campo: ArrayCompartilhado.conectar(d) for campo, d in descritor['blocos'].items()}
+        for bloco in blocos.values():
+            bloco.array.flags.writeable = False
+        return cls(blocos, descritor['vertices'], dono=dono)
+
+    @classmethod
+    def remover(cls, descritor):
+        """Remove os blocos de uma instância entregue por outro processo"""
+        cls.conectar(descritor, dono=True).fechar()
+
+    def descritor(self):
+        return {
+            'vertices': self.vertices,
+            'blocos': {campo: bloco.descritor() for campo, bloco in self.blocos.items()},
+        }
+
+    def entregar(self):
+        """Descritor para outro processo assumir os blocos; este só solta as suas visões"""
+        descritor = self.descritor()
+        self.dono = False
+        self.fechar()
+        return descritor
+
+    def montar(self):
+        """(grafo, capacidade) com a matriz de distâncias já definida, se foi publicada"""
+        grafo, capacidade = montar_grafo({campo: self.blocos[campo].array for campo in CAMPOS_DADOS})
+        if 'dist' in self.blocos:
+            grafo.definir_matriz_distancias(MatrizDistancias.de_arrays(
+                self.vertices, self.blocos['dist'].array, self.blocos['pred'].array))
+        self._grafos.append(grafo)
+        return grafo, capacidade
+
+    def fechar(self):
+        """Solta as visões; o dono também remove os blocos"""
+        # Os grafos montados deixam de apontar para os buffers antes de fechá-los
+        for grafo in self._grafos:
+            grafo.invalidar_cache()
+        self._grafos.clear()
+        for bloco in self.blocos.values():
+            if self.dono:
+                bloco.liberar()
+            else:
+                bloco.fechar()
@@ -0,0 +1,64 @@
+import json
+import time
+from collections import defaultdict
+from functools import wraps
+
+# Desligada por padrão: cada ponto instrumentado custa só o teste desta flag
+ATIVA = False
+
+_contadores = defaultdict(int)
+_chamadas = defaultdict(int)
+_tempos = defaultdict(float)
+
+def ativar(ligada=True):
+    """Liga (ou desliga) a coleta neste processo"""
+    global ATIVA
+    ATIVA = ligada
+
+def zerar():
+    _contadores.clear()
+    _chamadas.clear()
+    _tempos.clear()
+
+def contar(nome, quantidade=1):
+    """Soma 'quantidade' ao contador 'nome'"""
+    if ATIVA:
+        _contadores[nome] += quantidade
+
+def registrar_tempo(nome, segundos):
+    """Soma uma chamada de 'segundos' ao temporizador 'nome'"""
+    if ATIVA:
+        _chamadas[nome] += 1
+        _tempos[nome] += segundos
+
+def medido(nome=None):
+    """Decorador que conta as chamadas e soma o tempo (inclusivo) da função"""
+    def decorador(funcao):
+        rotulo = nome or funcao.__name__
+
+        @wraps(funcao)
+        def instrumentada(*args, **kwargs):
+            if not ATIVA:
+                return funcao(*args, **kwargs)
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                _chamadas[rotulo] += 1
+                _tempos[rotulo] += time.perf_counter() - inicio
+        return instrumentada
+    return decorador
+
+def perfil():
+    """Contadores e temporizadores coletados desde o último zerar()"""
+    return {
+        'contadores': dict(sorted(_contadores.items())),
+        'funcoes': {
+            nome: {'chamadas': _chamadas[nome], 'tempo': _tempos[nome]}
+            for nome in sorted(_tempos, key=_tempos.get, reverse=True)
+        },
+    }
+
+def salvar_perfil(caminho):
+    with open(caminho, 'w') as f:
+        json.dump(perfil(), f, indent=2)
@@ -1,82 +1,393 @@
 import os
 import sys
+import math
 import time
 import signal
 import gc
-from contextlib import contextmanager
+import argparse
+from contextlib import contextmanager, nullcontext
 from multiprocessing import Pool, cpu_count
 from utils_grafo import ler_arquivo_dat
 from solucao_writer import salvar_solucao
 from greedy_constructor import greedy_constructor
+from split_constructor import split_constructor
+from path_scanning import path_scanning_constructor
+from regret_constructor import regret_constructor
+from busca_local import busca_local
+from busca_iterada import busca_local_iterada
+from escalonador import ordenar_por_custo, iniciar_trabalhador, JanelaInstancias
+from instancia_compartilhada import InstanciaCompartilhada
+from memoria_compartilhada import iniciar_rastreador
+from manifesto import Manifesto, chave_execucao, configuracao_solver
+from utils_grafo import hash_arquivo
+import instrumentacao
+
+# Construtores disponíveis para montar a solução inicial
+CONSTRUTORES = {
+    'guloso': greedy_constructor,
+    'split': split_constructor,
+    'path_scanning': path_scanning_constructor,
+    'regret': regret_constructor,
+}
+
+class TempoEsgotado(Exception):
+    pass
+
+@contextmanager
+def limite_de_tempo(segundos):
+    """Interrompe o bloco com TempoEsgotado depois de 'segundos' (sem limite se None)"""
+    if not segundos:
+        yield
+        return
+
+    def estourou(signum, frame):
+        raise TempoEsgotado(f"Tempo limite de {segundos}s excedido")
+
+    anterior = signal.signal(signal.SIGALRM, estourou)
+    signal.setitimer(signal.ITIMER_REAL, segundos)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, anterior)
 
 def processar_arquivo(args):
-    nome_arq, caminho_instancia, pasta_saida = args
+    nome_arq = args[0]
+    config = args[-1]
+    try:
+        with limite_de_tempo(config['tempo_maximo']):
+            return resolver_instancia(*args)
+    except TempoEsgotado as e:
+        return False, nome_arq, str(e), None
+    except MemoryError:
+        return False, nome_arq, "Memória máxima excedida", None
+    finally:
+        gc.collect()
+
+@contextmanager
+def abrir_instancia(origem, pasta_cache):
+    """Grafo lido do arquivo, ou montado sobre a instância já carregada pelo processo principal"""
+    if isinstance(origem, str):
+        yield ler_arquivo_dat(origem, pasta_cache)
+        return
+    instancia = InstanciaCompartilhada.conectar(origem)
+    try:
+        yield instancia.montar()
+    finally:
+        instancia.fechar()
+
+def resolver_instancia(nome_arq, caminho_instancia, pasta_saida, pasta_cache, config):
     try:
         print(f"\nProcessando {nome_arq}")
+        # Clocks da solução, em ns de relógio desde o início da resolução
+        inicio = time.perf_counter_ns()
+        instrumentacao.ativar(config['perfil'])
+        instrumentacao.zerar()
         
-        # Lê o grafo e libera memória não utilizada
-        grafo, capacidade = ler_arquivo_dat(caminho_instancia)
-        print(f"Arquivo lido: {len(grafo.vertices)} vértices, {len(grafo.arestas)} arestas, {len(grafo.arcos)} arcos")
-        
-        # Constrói a solução
-        rotas = greedy_constructor(grafo, capacidade)
-        if not rotas:
-            return False, nome_arq, "Nenhuma rota criada"
+        # Lê o grafo (ou recebe a instância compartilhada) e libera memória não utilizada
+        with abrir_instancia(caminho_instancia, pasta_cache) as (grafo, capacidade):
+            grafo.processos = config['processos_instancia']
+            grafo.memoria_distancias = config['memoria_distancias']
+            grafo.pasta_distancias = config['pasta_distancias']
+            print(f"Arquivo lido: {len(grafo.vertices)} vértices, {len(grafo.arestas)} arestas, {len(grafo.arcos)} arcos")
+            
+            # Constrói a solução
+            construtor = CONSTRUTORES[config['motor']]
+            rotas = construtor(grafo, capacidade, grafo.deposito)
+            if not rotas:
+                return False, nome_arq, "Nenhuma rota criada", None
+            
+            # Melhora a solução construída dentro do tempo configurado
+            if config['ils']:
+                rotas, estatisticas = busca_local_iterada(
+                    rotas, grafo, capacidade, grafo.deposito,
+                    tempo_limite=config['tempo_ils'], iteracoes=config['iteracoes_ils'],
+                    tempo_busca_local=config['tempo_busca_local'], inicio=inicio)
+                custos, cargas = estatisticas['custos'], estatisticas['cargas']
+                clocks_melhor_sol = estatisticas['clocks_melhor_sol']
+            else:
+                custos = cargas = None
+                if config['busca_local']:
+                    rotas, custos, cargas = busca_local(rotas, grafo, capacidade, grafo.deposito,
+                                                        config['tempo_busca_local'], resumo=True)
+                clocks_melhor_sol = time.perf_counter_ns() - inicio
+            
+            # Salva a solução
+            nome_saida = f"sol-{os.path.splitext(nome_arq)[0]}.dat"
+            caminho_saida = os.path.join(pasta_saida, nome_saida)
+            clocks = time.perf_counter_ns() - inicio
+            custo = salvar_solucao(rotas, grafo, capacidade, caminho_saida, grafo.deposito,
+                                   clocks=clocks, clocks_melhor_sol=clocks_melhor_sol,
+                                   custos=custos, cargas=cargas)
+            if config['perfil']:
+                instrumentacao.salvar_perfil(f"{os.path.splitext(caminho_saida)[0]}.perfil.json")
+            
+            # Resumo da execução para o manifesto do lote
+            registro = {
+                'instancia': nome_arq,
+                'motor': config['motor'],
+                'saida': caminho_saida,
+                'custo': custo,
+                'rotas': [[s['id'] for s in rota] for rota in rotas],
+                'tempo': clocks / 1e9,
+                'clocks': clocks,
+                'clocks_melhor_sol': clocks_melhor_sol,
+            }
+            
+            # Libera memória explicitamente
+            del grafo
+            del rotas
+            gc.collect()
         
-        # Salva a solução
-        nome_saida = f"sol-{os.path.splitext(nome_arq)[0]}.dat"
-        caminho_saida = os.path.join(pasta_saida, nome_saida)
-        salvar_solucao(rotas, grafo, capacidade, caminho_saida)
-        
-        # Libera memória explicitamente
-        del grafo
-        del rotas
-        gc.collect()
-        
-        return True, nome_arq, None
+        return True, nome_arq, None, registro
         
+    except (TempoEsgotado, MemoryError):
+        raise
+    except Exception as e:
+        return False, nome_arq, f"Erro: {str(e)}", None
+
+def pasta_do_motor(pasta_saida, motor, config):
+    """Com vários motores, a solução de cada um vai para uma subpasta própria"""
+    return os.path.join(pasta_saida, motor) if len(config['motores']) > 1 else pasta_saida
+
+def publicar_instancia(args):
+    """Lê a instância e a publica em memória compartilhada, com os limites de tempo e memória de um worker.
+
+    Devolve (descritor, erro); os blocos passam ao processo principal, que
+    os remove quando todos os motores da instância terminarem.
+    """
+    caminho, pasta_cache, config = args
+    try:
+        with limite_de_tempo(config['tempo_maximo']):
+            instancia = InstanciaCompartilhada.publicar(caminho, pasta_cache, config['processos_instancia'],
+                                                       config['memoria_distancias'])
+    except TempoEsgotado as e:
+        return None, str(e)
+    except MemoryError:
+        return None, "Memória máxima excedida"
     except Exception as e:
-        return False, nome_arq, f"Erro: {str(e)}"
+        return None, f"Erro: {str(e)}"
+    finally:
+        gc.collect()
+    return instancia.entregar(), None
+
+def executar_tarefa(tarefa):
+    """Tarefa do lote compartilhado: publicar uma instância ou resolvê-la com um motor"""
+    tipo, indice, motor, args = tarefa
+    if tipo == 'publicar':
+        return tipo, indice, motor, publicar_instancia(args)
+    return tipo, indice, motor, processar_arquivo(args)
+
+def resolver_compartilhado(pool, pendentes, pasta_saida, pasta_cache, config, processos=1):
+    """Roda os motores pendentes de cada instância, lida uma única vez.
+
+    Publicações e motores de todas as instâncias passam por uma única fila
+    do pool, na ordem LPT: um worker lê a instância e publica a leitura e a
+    matriz de distâncias em memória compartilhada, e cada motor recebe só o
+    descritor. Para manter os cores ocupados, as próximas instâncias são
+    publicadas enquanto a atual roda, até o tamanho da janela; os blocos de
+    uma instância são removidos quando todos os seus motores respondem. A
+    solução de cada motor vai para pasta_saida/<motor>.
+    """
+    # Instâncias publicadas suficientes para todos os processos mais uma na frente
+    janela = JanelaInstancias(math.ceil(processos / len(config['motores'])) + 1 if pool else 1)
+    faltam = {i: len(motores) for i, (_, _, motores) in enumerate(pendentes)}
+    descritores = {}
+
+    def tarefas():
+        # Percorrido pelo pool (ou pelo map, sem pool) à medida que despacha
+        publicadas = 0
+        for i, (nome_arq, _, motores) in enumerate(pendentes):
+            # Publica a instância i e, havendo vaga, as seguintes
+            while publicadas <= i or (publicadas < len(pendentes) and janela.tem_vaga()):
+                if not janela.reservar():
+                    return
+                yield 'publicar', publicadas, None, (pendentes[publicadas][1], pasta_cache, config)
+                publicadas += 1
+            descritor = janela.esperar(i)
+            if descritor is None:
+                continue
+            for motor in motores:
+                pasta_motor = pasta_do_motor(pasta_saida, motor, config)
+                yield 'resolver', i, motor, (nome_arq, descritor, pasta_motor, pasta_cache, dict(config, motor=motor))
+
+    resultados = (pool.imap_unordered(executar_tarefa, tarefas(), chunksize=1) if pool
+                  else map(executar_tarefa, tarefas()))
+    try:
+        for tipo, i, motor, resultado in resultados:
+            nome_arq, _, motores = pendentes[i]
+            if tipo == 'publicar':
+                descritor, erro = resultado
+                janela.entregar(i, descritor)
+                if descritor is None:
+                    janela.devolver()
+                    for motor in motores:
+                        yield False, f"{nome_arq} [{motor}]", erro, None
+                else:
+                    descritores[i] = descritor
+                continue
+            sucesso, _, erro, registro = resultado
+            faltam[i] -= 1
+            if not faltam[i]:
+                InstanciaCompartilhada.remover(descritores.pop(i))
+                janela.devolver()
+            yield sucesso, f"{nome_arq} [{motor}]", erro, registro
+    finally:
+        janela.encerrar()
+        for descritor in descritores.values():
+            InstanciaCompartilhada.remover(descritor)
+
+def encerrar(pool, resultados):
+    """Interrompe o lote, soltando antes o gerador de tarefas que pode estar esperando"""
+    if hasattr(resultados, 'close'):
+        resultados.close()
+    if pool:
+        pool.terminate()
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description="Resolve as instâncias CARP de selected_instances")
+    parser.add_argument('--motor', nargs='+', choices=sorted(CONSTRUTORES), default=['guloso'],
+                        help="construtor da solução inicial; com vários, cada instância é lida uma "
+                             "vez e compartilhada entre eles, e as soluções vão para solucoes/<motor>")
+    parser.add_argument('--tempo-busca-local', type=float, default=10.0,
+                        help="tempo máximo (s) da busca local por instância")
+    parser.add_argument('--sem-busca-local', action='store_true',
+                        help="grava a solução do construtor sem a fase de melhoria")
+    parser.add_argument('--tempo-ils', type=float, default=None,
+                        help="tempo máximo (s) da busca local iterada por instância")
+    parser.add_argument('--iteracoes-ils', type=int, default=None,
+                        help="número máximo de iterações da busca local iterada")
+    parser.add_argument('--processos', type=int, default=max(1, cpu_count() - 1),
+                        help="número de processos do pool")
+    parser.add_argument('--tempo-maximo', type=float, default=None,
+                        help="aborta a instância que passar deste tempo (s)")
+    parser.add_argument('--memoria-maxima', type=float, default=None,
+                        help="memória máxima (MB) de cada processo do pool")
+    parser.add_argument('--processos-instancia', type=int, default=1,
+                        help="processos usados dentro de cada instância (matriz de distâncias e "
+                             "inserções do guloso); com mais de 1, as instâncias rodam uma por vez")
+    parser.add_argument('--memoria-distancias', type=float, default=None,
+                        help="memória (MB) para as distâncias de cada instância; se a matriz densa "
+                             "não couber, as linhas são calculadas sob demanda e mantidas em um LRU")
+    parser.add_argument('--pasta-distancias', default=None,
+                        help="espelha em um arquivo mapeado nesta pasta as linhas que saem do LRU")
+    parser.add_argument('--instancias', nargs='+', default=None,
+                        help="resolve só estas instâncias (nomes sem .dat)")
+    parser.add_argument('--perfil', action='store_true',
+                        help="grava contadores e tempos das funções em sol-<instância>.perfil.json "
+                             "(resolve de novo mesmo o que já está no manifesto)")
+    parser.add_argument('--refazer', action='store_true',
+                        help="resolve de novo as execuções já registradas no manifesto")
+    return parser.parse_args()
 
 def main():
+    argumentos = ler_argumentos()
+    config = {
+        'motor': argumentos.motor[0],
+        'motores': list(dict.fromkeys(argumentos.motor)),
+        'busca_local': not argumentos.sem_busca_local,
+        'tempo_busca_local': argumentos.tempo_busca_local,
+        # A busca iterada substitui a busca local simples quando tem algum orçamento
+        'ils': argumentos.tempo_ils is not None or argumentos.iteracoes_ils is not None,
+        'tempo_ils': argumentos.tempo_ils,
+        'iteracoes_ils': argumentos.iteracoes_ils,
+        'tempo_maximo': argumentos.tempo_maximo,
+        'processos_instancia': argumentos.processos_instancia,
+        'memoria_distancias': (int(argumentos.memoria_distancias * 1024 * 1024)
+                               if argumentos.memoria_distancias is not None else None),
+        'pasta_distancias': argumentos.pasta_distancias,
+        'perfil': argumentos.perfil,
+    }
+    
     # Usando caminhos absolutos baseados na localização do script
     script_dir = os.path.dirname(os.path.abspath(__file__))
     pasta_instancias = os.path.abspath(os.path.join(script_dir, '..', 'selected_instances'))
     pasta_saida = os.path.abspath(os.path.join(script_dir, 'solucoes'))
+    pasta_cache = os.path.abspath(os.path.join(script_dir, 'cache'))
     os.makedirs(pasta_saida, exist_ok=True)
     
-    # Lista todos os arquivos .dat e ordena por tamanho
+    # Lista todos os arquivos .dat
     arquivos = []
     for nome_arq in os.listdir(pasta_instancias):
         if nome_arq.endswith('.dat'):
-            caminho = os.path.join(pasta_instancias, nome_arq)
-            tamanho = os.path.getsize(caminho)
-            arquivos.append((nome_arq, caminho, tamanho))
+            arquivos.append((nome_arq, os.path.join(pasta_instancias, nome_arq)))
+    if argumentos.instancias:
+        arquivos = [arq for arq in arquivos if os.path.splitext(arq[0])[0] in argumentos.instancias]
+    
+    # Ordena pelo custo estimado a partir do cabeçalho (processa os maiores primeiro)
+    arquivos = ordenar_por_custo(arquivos)
     
-    # Ordena por tamanho (processa os menores primeiro)
-    arquivos.sort(key=lambda x: x[2])
+    # Pula as execuções já registradas no manifesto: mesma instância (pelo conteúdo)
+    # com a mesma configuração e solução ainda no disco. Com --perfil tudo roda de
+    # novo, porque o manifesto não guarda o perfil e ele só sai de uma execução
+    manifesto = Manifesto(os.path.join(pasta_saida, 'manifesto.jsonl'))
+    chaves = {}
+    pendentes = []
+    for nome_arq, caminho in arquivos:
+        hash_instancia = hash_arquivo(caminho).hex()
+        motores = []
+        for motor in config['motores']:
+            chave = chave_execucao(hash_instancia, dict(config, motor=motor))
+            saida = os.path.join(pasta_do_motor(pasta_saida, motor, config),
+                                 f"sol-{os.path.splitext(nome_arq)[0]}.dat")
+            if argumentos.refazer or config['perfil'] or not manifesto.concluido(chave, saida):
+                chaves[(nome_arq, motor)] = (chave, hash_instancia)
+                motores.append(motor)
+        if motores:
+            pendentes.append((nome_arq, caminho, motores))
     
     # Prepara argumentos para processamento paralelo
-    args = [(arq[0], arq[1], pasta_saida) for arq in arquivos]
-    total_arquivos = len(args)
+    args = [(nome_arq, caminho, pasta_saida, pasta_cache, config) for nome_arq, caminho, _ in pendentes]
+    # Com vários motores, cada par (instância, motor) conta como um arquivo de solução
+    total_arquivos = len(chaves)
+    ja_concluidos = len(arquivos) * len(config['motores']) - total_arquivos
+    if ja_concluidos:
+        print(f"{ja_concluidos} execuções já concluídas no manifesto (use --refazer para resolvê-las de novo)")
+    if not total_arquivos:
+        print("Nada a processar")
+        return
+    if len(config['motores']) > 1:
+        for motor in config['motores']:
+            os.makedirs(os.path.join(pasta_saida, motor), exist_ok=True)
     
-    # Usa menos cores para evitar sobrecarga de memória
-    num_cores = max(1, cpu_count() - 1)
+    # Usa menos cores para evitar sobrecarga de memória. Com paralelismo dentro da
+    # instância, os arquivos rodam um por vez no processo principal, porque os
+    # processos (daemon) do pool não podem ter filhos
+    paralelo_entre_arquivos = config['processos_instancia'] <= 1
+    num_cores = argumentos.processos if paralelo_entre_arquivos else config['processos_instancia']
     print(f"\nIniciando processamento de {total_arquivos} arquivos usando {num_cores} cores")
-    print("Arquivos ordenados por tamanho (processando menores primeiro)")
+    print("Arquivos ordenados por custo estimado (processando maiores primeiro)")
     
     # Inicializa contadores
     inicio = time.time()
     arquivos_processados = 0
     arquivos_com_erro = 0
     
-    # Processa em paralelo com menos workers
-    with Pool(processes=num_cores) as pool:
+    # Processa em paralelo; com chunksize=1 cada processo livre pega a próxima instância da fila
+    if paralelo_entre_arquivos:
+        # Os workers recebem instâncias em memória compartilhada (ver resolver_compartilhado)
+        iniciar_rastreador()
+        contexto = Pool(processes=num_cores, initializer=iniciar_trabalhador, initargs=(argumentos.memoria_maxima,))
+    else:
+        iniciar_trabalhador(argumentos.memoria_maxima)
+        contexto = nullcontext()
+    with contexto as pool:
+        if len(config['motores']) > 1:
+            resultados = resolver_compartilhado(pool, pendentes, pasta_saida, pasta_cache, config, num_cores)
+        elif pool:
+            resultados = pool.imap_unordered(processar_arquivo, args, chunksize=1)
+        else:
+            resultados = map(processar_arquivo, args)
         try:
-            for i, (sucesso, nome_arq, erro) in enumerate(pool.imap_unordered(processar_arquivo, args), 1):
+            for i, (sucesso, nome_arq, erro, registro) in enumerate(resultados, 1):
                 if sucesso:
                     arquivos_processados += 1
                     print(f"[{i}/{total_arquivos}] ✓ {nome_arq}")
+                    chave, hash_instancia = chaves[(registro['instancia'], registro['motor'])]
+                    manifesto.registrar(dict(
+                        registro, chave=chave, hash_instancia=hash_instancia,
+                        config=configuracao_solver(dict(config, motor=registro['motor']))
+                    ))
                 else:
                     arquivos_com_erro += 1
                     print(f"[{i}/{total_arquivos}] ✗ {nome_arq}: {erro}")
@@ -96,11 +407,11 @@ def main():
                     gc.collect()
                 
         except KeyboardInterrupt:
-            print("\nProcessamento interrompido pelo usuário")
-            pool.terminate()
+            print("\nProcessamento interrompido pelo usuário; rode de novo para continuar de onde parou")
+            encerrar(pool, resultados)
         except Exception as e:
             print(f"\nErro no processamento: {str(e)}")
-            pool.terminate()
+            encerrar(pool, resultados)
     
     tempo_total = time.time() - inicio
     
@@ -0,0 +1,65 @@
+import hashlib
+import json
+import os
+
+from utils_grafo import hash_arquivo
+
+# Campos da configuração que mudam a solução (processos e limites não mudam)
+CAMPOS_CONFIG = ('motor', 'busca_local', 'tempo_busca_local', 'ils', 'tempo_ils', 'iteracoes_ils')
+
+def configuracao_solver(config):
+    return {campo: config.get(campo) for campo in CAMPOS_CONFIG}
+
+def chave_execucao(hash_instancia, config):
+    """Identifica uma execução pelo conteúdo da instância e pela configuração do solver"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(hash_instancia.encode())
+    h.update(json.dumps(configuracao_solver(config), sort_keys=True).encode())
+    return h.hexdigest()
+
+class Manifesto:
+    """Registro em JSON-lines das execuções concluídas de um lote.
+
+    Cada linha guarda a chave (hash da instância + configuração), o custo,
+    as rotas (ids dos serviços) e os tempos de uma solução gravada. Linhas
+    são acrescentadas e sincronizadas uma a uma, então um lote interrompido
+    perde no máximo as instâncias que estavam em andamento; uma última linha
+    incompleta é ignorada na leitura.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.registros = {}
+        self._linha_incompleta = False
+        if os.path.exists(caminho):
+            with open(caminho, 'r') as f:
+                for linha in f:
+                    self._linha_incompleta = not linha.endswith('\n')
+                    try:
+                        registro = json.loads(linha)
+                    except json.JSONDecodeError:
+                        continue
+                    self.registros[registro['chave']] = registro
+
+    def concluido(self, chave, caminho_saida):
+        """A execução já foi registrada e a solução gravada continua no disco.
+
+        O hash do arquivo evita aceitar uma solução que outra configuração
+        sobrescreveu no mesmo caminho.
+        """
+        registro = self.registros.get(chave)
+        if registro is None or not os.path.exists(caminho_saida):
+            return False
+        return hash_arquivo(caminho_saida).hex() == registro.get('hash_saida')
+
+    def registrar(self, registro):
+        """Acrescenta uma execução concluída, com o hash da solução que ela gravou"""
+        registro = dict(registro, hash_saida=hash_arquivo(registro['saida']).hex())
+        with open(self.caminho, 'a') as f:
+            if self._linha_incompleta:
+                f.write('\n')
+                self._linha_incompleta = False
+            f.write(json.dumps(registro) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.registros[registro['chave']] = registro
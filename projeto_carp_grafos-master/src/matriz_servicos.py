@@ -0,0 +1,84 @@
+import numpy as np
+
+from grafo_cache import memoizado
+from greedy_constructor import coletar_servicos
+
+INF = float('inf')
+
+class MatrizServicos:
+    """Distâncias entre serviços requeridos, indexadas por ids compactos 0..S-1.
+
+    O id compacto segue a ordem de coletar_servicos; indice leva o id do
+    arquivo ao compacto. Cada serviço tem até duas orientações (arestas podem
+    ser atendidas nos dois sentidos): inicios[k] e fins[k] guardam os índices
+    de vértice da direção do arquivo (coluna 0) e da invertida (coluna 1, igual
+    à 0 para arcos e nós). dist[i, j] é o menor deslocamento do fim de i ao
+    início de j entre as orientações possíveis dos dois, com INF na diagonal.
+    """
+
+    def __init__(self, grafo):
+        matriz = grafo.matriz_distancias()
+        indice_vertice = matriz.indice
+        self.servicos = coletar_servicos(grafo)
+        self.indice = {s['id']: k for k, s in enumerate(self.servicos)}
+        n = len(self.servicos)
+
+        inicios = np.empty((n, 2), dtype=np.int64)
+        fins = np.empty((n, 2), dtype=np.int64)
+        for k, s in enumerate(self.servicos):
+            u, v = indice_vertice[s['u']], indice_vertice[s['v']]
+            inicios[k] = (u, v) if s['tipo'] == 'aresta' else (u, u)
+            fins[k] = (v, u) if s['tipo'] == 'aresta' else (v, v)
+        self.inicios, self.fins = inicios, fins
+        self.demandas = np.array([s['demanda'] for s in self.servicos], dtype=np.float64)
+        self.custos = np.array([s['custo'] for s in self.servicos], dtype=np.float64)
+
+        # Submatriz só com os vértices que são ponta de algum serviço ou o depósito
+        dep = indice_vertice[grafo.deposito]
+        pontos, local = np.unique(np.concatenate([[dep], inicios.ravel(), fins.ravel()]), return_inverse=True)
+        D = matriz.dist[np.ix_(pontos, pontos)]
+        dep_local = local[0]
+        ini = local[1:1 + 2 * n].reshape(n, 2)
+        fim = local[1 + 2 * n:].reshape(n, 2)
+
+        self.dist = np.minimum.reduce([
+            D[np.ix_(fim[:, a], ini[:, b])] for a in (0, 1) for b in (0, 1)
+        ]) if n else np.empty((0, 0))
+        np.fill_diagonal(self.dist, INF)
+        # Melhor orientação para sair do depósito até o serviço e voltar dele
+        self.do_deposito = D[dep_local, ini].min(axis=1) if n else np.empty(0)
+        self.ate_deposito = D[fim, dep_local].min(axis=1) if n else np.empty(0)
+        self._vizinhos = {}
+
+    def vizinhos(self, k, simetrico=False):
+        """Array S×k com os k serviços mais próximos de cada um, do mais perto ao mais longe.
+
+        Com simetrico=True a proximidade considera os dois sentidos
+        (min(dist[i, j], dist[j, i])). Calculado uma vez por k e reaproveitado.
+        """
+        n = len(self.servicos)
+        k = max(0, min(k, n - 1))
+        chave = (k, simetrico)
+        if chave not in self._vizinhos:
+            dist = np.minimum(self.dist, self.dist.T) if simetrico else self.dist
+            if k == 0:
+                proximos = np.empty((n, 0), dtype=np.int64)
+            else:
+                proximos = np.argpartition(dist, k - 1, axis=1)[:, :k]
+                ordem = np.argsort(np.take_along_axis(dist, proximos, axis=1), axis=1, kind='stable')
+                proximos = np.take_along_axis(proximos, ordem, axis=1)
+            self._vizinhos[chave] = proximos
+        return self._vizinhos[chave]
+
+    def mais_proximos(self, servico, candidatos):
+        """(serviço, distância) dos candidatos alcançáveis a partir de 'servico', em ordem de distância"""
+        if not candidatos:
+            return []
+        linha = self.dist[self.indice[servico['id']]]
+        dist = linha[[self.indice[s['id']] for s in candidatos]]
+        return [(candidatos[i], dist[i].item()) for i in np.argsort(dist, kind='stable') if dist[i] != INF]
+
+@memoizado
+def matriz_servicos(self):
+    """Retorna a matriz de distâncias entre serviços, construindo-a na primeira chamada"""
+    return MatrizServicos(self)
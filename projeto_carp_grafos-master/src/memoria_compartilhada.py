@@ -0,0 +1,60 @@
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+def iniciar_rastreador():
+    """Inicia o resource_tracker antes de criar um pool.
+
+    Processos criados por fork herdam o rastreador do pai só se ele já
+    existir; senão cada um inicia o seu, que no fim acusa como vazados os
+    blocos em que o processo apenas se conectou.
+    """
+    resource_tracker.ensure_running()
+
+class ArrayCompartilhado:
+    """Array NumPy guardado em um bloco de multiprocessing.shared_memory.
+
+    Quem cria o bloco é o dono e deve chamar liberar() ao terminar; os
+    outros processos se conectam pelo descritor (nome, forma, dtype) e
+    recebem uma visão do mesmo buffer, sem cópia, chamando fechar() no fim.
+    """
+
+    def __init__(self, forma, dtype, nome=None):
+        self.forma = tuple(forma)
+        self.dtype = np.dtype(dtype)
+        tamanho = max(1, int(np.prod(self.forma)) * self.dtype.itemsize)
+        if nome is None:
+            self._memoria = shared_memory.SharedMemory(create=True, size=tamanho)
+        else:
+            self._memoria = shared_memory.SharedMemory(name=nome)
+        self.array = np.ndarray(self.forma, dtype=self.dtype, buffer=self._memoria.buf)
+
+    @classmethod
+    def copiar(cls, array):
+        """Novo bloco com uma cópia do array"""
+        compartilhado = cls(array.shape, array.dtype)
+        compartilhado.array[...] = array
+        return compartilhado
+
+    @classmethod
+    def conectar(cls, descritor):
+        """Visão de um bloco criado em outro processo"""
+        nome, forma, dtype = descritor
+        return cls(forma, dtype, nome)
+
+    @property
+    def nome(self):
+        return self._memoria.name
+
+    def descritor(self):
+        return self.nome, self.forma, self.dtype.str
+
+    def fechar(self):
+        """Solta a visão deste processo; o bloco continua existindo"""
+        self.array = None
+        self._memoria.close()
+
+    def liberar(self):
+        """Fecha e remove o bloco (só o dono deve chamar)"""
+        self.fechar()
+        self._memoria.unlink()
@@ -0,0 +1,155 @@
+import multiprocessing
+from multiprocessing import Pool, cpu_count
+
+import numpy as np
+
+from greedy_constructor import coletar_servicos, orientar
+from instrumentacao import medido
+
+INF = float('inf')
+
+# Critérios de desempate de Golden, DeArmon & Baker
+REGRAS = (
+    'max_dist_deposito',  # afasta-se do depósito
+    'min_dist_deposito',  # aproxima-se do depósito
+    'max_rendimento',     # maior demanda / custo
+    'min_rendimento',     # menor demanda / custo
+    'capacidade',         # afasta-se até metade da capacidade, depois aproxima-se
+)
+
+# Dados da instância em cada processo do pool (ver _iniciar_trabalhador)
+_DADOS = None
+
+def preparar_dados(servicos, grafo, capacidade, deposito):
+    """Arrays usados pelo path-scanning, com uma entrada por orientação de serviço"""
+    matriz = grafo.matriz_distancias()
+    indice = matriz.indice
+    inicios = np.array([indice[s['u']] for s in servicos])
+    fins = np.array([indice[s['v']] for s in servicos])
+    arestas = np.flatnonzero([s['tipo'] == 'aresta' for s in servicos])
+    demandas = np.array([s['demanda'] for s in servicos])
+    custos = np.array([s['custo'] for s in servicos], dtype=np.float64)
+    dep = indice[deposito]
+
+    # Arestas entram duas vezes, uma em cada direção
+    servico = np.concatenate([np.arange(len(servicos)), arestas])
+    invertido = np.concatenate([np.zeros(len(servicos), dtype=bool), np.ones(len(arestas), dtype=bool)])
+    inicio_o = np.where(invertido, fins[servico], inicios[servico])
+    fim_o = np.where(invertido, inicios[servico], fins[servico])
+    # Nós não têm custo de travessia: rendimento infinito
+    rendimento = np.divide(demandas[servico], custos[servico], out=np.full(len(servico), INF),
+                           where=custos[servico] > 0)
+
+    return {
+        'dist': matriz.dist,
+        'deposito': dep,
+        'capacidade': capacidade,
+        'num_servicos': len(servicos),
+        'demandas': demandas,
+        'custos': custos,
+        'servico': servico,
+        'invertido': invertido,
+        'inicio': inicio_o,
+        'fim': fim_o,
+        'dist_deposito': matriz.dist[fim_o, dep],
+        'rendimento': rendimento,
+    }
+
+def _desempatar(regra, empatados, dados, carga, rng):
+    if regra == 'aleatoria':
+        return rng.choice(empatados)
+    if regra == 'capacidade':
+        regra = 'max_dist_deposito' if carga < dados['capacidade'] / 2 else 'min_dist_deposito'
+    criterio = dados['dist_deposito'] if regra.endswith('dist_deposito') else dados['rendimento']
+    valores = criterio[empatados]
+    return empatados[np.argmax(valores) if regra.startswith('max') else np.argmin(valores)]
+
+def path_scanning(dados, regra, semente=None):
+    """Uma execução do path-scanning com o critério de desempate dado.
+
+    Cada rota cresce a partir do depósito escolhendo o serviço viável mais
+    próximo do ponto atual; empates de distância são resolvidos pela regra.
+    Retorna (custo, rotas), com rotas como listas de (serviço, invertido).
+    """
+    dist = dados['dist']
+    capacidade = dados['capacidade']
+    servico, inicio, fim = dados['servico'], dados['inicio'], dados['fim']
+    demanda_o = dados['demandas'][servico]
+    rng = np.random.default_rng(semente) if regra == 'aleatoria' else None
+
+    restante = np.ones(dados['num_servicos'], dtype=bool)
+    rotas = []
+    custo_total = 0
+    while restante.any():
+        rota = []
+        carga = 0
+        atual = dados['deposito']
+        while True:
+            viaveis = restante[servico] & (demanda_o <= capacidade - carga)
+            if not viaveis.any():
+                break
+            d = np.where(viaveis, dist[atual, inicio], INF)
+            menor = d.min()
+            if menor == INF:
+                if rota:
+                    break  # nada alcançável daqui: volta ao depósito
+                empatados = np.flatnonzero(viaveis)
+            else:
+                empatados = np.flatnonzero(d == menor)
+            o = _desempatar(regra, empatados, dados, carga, rng)
+
+            k = servico[o]
+            rota.append((int(k), bool(dados['invertido'][o])))
+            restante[k] = False
+            carga += dados['demandas'][k]
+            custo_total += dist[atual, inicio[o]] + dados['custos'][k]
+            atual = fim[o]
+
+        if not rota:
+            raise ValueError("Há serviço com demanda maior que a capacidade do veículo")
+        custo_total += dist[atual, dados['deposito']]
+        rotas.append(rota)
+
+    return float(custo_total), rotas
+
+def _iniciar_trabalhador(dados):
+    global _DADOS
+    _DADOS = dados
+
+def _executar_variante(tarefa):
+    regra, semente = tarefa
+    return path_scanning(_DADOS, regra, semente)
+
+@medido()
+def path_scanning_constructor(grafo, capacidade, deposito='1', processos=None, variantes_aleatorias=0, semente=0):
+    """Roda as cinco regras de path-scanning (e variantes aleatórias) e devolve a melhor solução.
+
+    As variantes rodam em um pool de processos, que recebe os dados da
+    instância uma única vez na inicialização. Dentro de um worker de outro
+    pool (como em main.py) os processos não podem ter filhos, então as
+    variantes rodam em sequência.
+    """
+    servicos = coletar_servicos(grafo)
+    if not servicos:
+        print("Nenhum serviço requerido encontrado no grafo")
+        return []
+
+    dados = preparar_dados(servicos, grafo, capacidade, deposito)
+    tarefas = [(regra, None) for regra in REGRAS]
+    tarefas += [('aleatoria', semente + i) for i in range(variantes_aleatorias)]
+
+    if processos is None:
+        processos = min(len(tarefas), cpu_count())
+    if processos <= 1 or multiprocessing.current_process().daemon:
+        _iniciar_trabalhador(dados)
+        resultados = [_executar_variante(tarefa) for tarefa in tarefas]
+    else:
+        with Pool(processes=processos, initializer=_iniciar_trabalhador, initargs=(dados,)) as pool:
+            resultados = pool.map(_executar_variante, tarefas, chunksize=1)
+
+    _, melhores = min(resultados, key=lambda resultado: resultado[0])
+    return [
+        [orientar(servicos[k], servicos[k]['v'], servicos[k]['u']) if invertido else servicos[k]
+         for k, invertido in rota]
+        for rota in melhores
+    ]
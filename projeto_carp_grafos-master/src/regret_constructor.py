@@ -0,0 +1,224 @@
+import math
+from heapq import heappush, heappop
+
+import numpy as np
+
+from greedy_constructor import orientar, orientar_rota
+from instrumentacao import medido, contar
+from rota import Rota
+
+INF = float('inf')
+
+class InsercaoRegret:
+    """Inserção paralela por arrependimento (regret-k) em várias rotas ao mesmo tempo.
+
+    Para cada serviço não atendido guarda, em C[j, r], o menor custo de
+    inseri-lo na rota r (posição em P, orientação em O), e o custo de abrir
+    uma rota só para ele. O arrependimento de j é a soma das diferenças entre
+    as k melhores opções e a melhor; o serviço de maior arrependimento é
+    inserido primeiro, na sua melhor opção.
+
+    Os arrependimentos ficam em um heap com invalidação preguiçosa: cada
+    serviço tem uma versão, e entradas de versões antigas são descartadas ao
+    sair do heap. Depois de uma inserção só a coluna da rota alterada muda, e
+    nela só é recalculado por completo quem tinha como melhor posição a
+    ligação desfeita; os demais comparam o valor antigo com as duas ligações
+    novas. Só os serviços cujo custo mudou voltam para o heap.
+    """
+
+    def __init__(self, grafo, capacidade, deposito, k=2):
+        servicos = grafo.matriz_servicos()
+        matriz = grafo.matriz_distancias()
+        self.servicos = servicos.servicos
+        self.matriz = matriz
+        self.deposito = deposito
+        self.dist = matriz.dist
+        self.dep = matriz.indice[deposito]
+        self.capacidade = capacidade
+        self.k = k
+        self.inicios, self.fins = servicos.inicios, servicos.fins
+        self.q, self.c = servicos.demandas, servicos.custos
+        self.aresta = np.array([s['tipo'] == 'aresta' for s in self.servicos], dtype=bool)
+        self.matriz_servicos = servicos
+
+        n = len(self.servicos)
+        # Rota exclusiva: depósito -> serviço -> depósito, na melhor orientação
+        sozinho = self.dist[self.dep, self.inicios] + self.c[:, None] + self.dist[self.fins, self.dep]
+        self.sozinho = sozinho.min(axis=1)
+        self.orientacao_sozinho = sozinho.argmin(axis=1)
+
+        self.rotas = []
+        self.atendido = np.zeros(n, dtype=bool)
+        self.versao = np.zeros(n, dtype=np.int64)
+        self.heap = []
+        colunas = max(8, 2 * self._rotas_minimas())
+        self.C = np.full((n, colunas), INF)
+        self.P = np.zeros((n, colunas), dtype=np.int64)
+        self.O = np.zeros((n, colunas), dtype=np.int8)
+
+    def _rotas_minimas(self):
+        return max(1, math.ceil(self.q.sum() / self.capacidade)) if len(self.q) else 0
+
+    def _pendentes(self):
+        return np.flatnonzero(~self.atendido)
+
+    def _melhores_posicoes(self, J, anteriores, proximos, primeira=0):
+        """Menor custo de inserir cada serviço de J entre anteriores[p] e proximos[p].
+
+        Devolve (custo, posição somada a 'primeira', orientação); arestas são
+        testadas nas duas direções.
+        """
+        base = self.dist[anteriores, proximos]
+        custo = np.full(len(J), INF)
+        posicao = np.zeros(len(J), dtype=np.int64)
+        orientacao = np.zeros(len(J), dtype=np.int8)
+        for o, linhas in ((0, np.arange(len(J))), (1, np.flatnonzero(self.aresta[J]))):
+            if not len(linhas):
+                continue
+            Jo = J[linhas]
+            contar('regret.avaliacoes', len(Jo) * len(base))
+            delta = (self.dist[np.ix_(anteriores, self.inicios[Jo, o])]
+                     + self.dist[np.ix_(self.fins[Jo, o], proximos)].T
+                     - base[:, None] + self.c[Jo])
+            p = delta.argmin(axis=0)
+            valor = delta[p, np.arange(len(Jo))]
+            melhor = valor < custo[linhas]
+            custo[linhas[melhor]] = valor[melhor]
+            posicao[linhas[melhor]] = p[melhor] + primeira
+            orientacao[linhas[melhor]] = o
+        return custo, posicao, orientacao
+
+    def _calcular_coluna(self, r, J):
+        """Recalcula por completo C/P/O da rota r para os serviços J"""
+        if not len(J):
+            return
+        contar('regret.recalculos_completos', len(J))
+        custo, posicao, orientacao = self._melhores_posicoes(J, *self.rotas[r].ligacoes())
+        custo[self.rotas[r].carga + self.q[J] > self.capacidade] = INF
+        self.C[J, r], self.P[J, r], self.O[J, r] = custo, posicao, orientacao
+
+    def _nova_coluna(self):
+        r = len(self.rotas)
+        if r == self.C.shape[1]:
+            extra = self.C.shape[1]
+            self.C = np.hstack([self.C, np.full((len(self.C), extra), INF)])
+            self.P = np.hstack([self.P, np.zeros((len(self.P), extra), dtype=np.int64)])
+            self.O = np.hstack([self.O, np.zeros((len(self.O), extra), dtype=np.int8)])
+        return r
+
+    def _arrependimentos(self, J):
+        """(arrependimento, melhor custo) de cada serviço de J sobre as opções atuais"""
+        opcoes = np.concatenate([self.C[J, :len(self.rotas)], self.sozinho[J, None]], axis=1)
+        k = min(self.k, opcoes.shape[1])
+        menores = np.sort(np.partition(opcoes, k - 1, axis=1)[:, :k], axis=1)
+        melhor = menores[:, 0]
+        with np.errstate(invalid='ignore'):
+            arrependimento = (menores[:, 1:] - melhor[:, None]).sum(axis=1)
+        # Inalcançáveis vão para o fim da fila
+        return np.where(np.isfinite(melhor), arrependimento, -INF), melhor
+
+    def _enfileirar(self, J):
+        if not len(J):
+            return
+        contar('regret.atualizacoes_heap', len(J))
+        self.versao[J] += 1
+        arrependimento, melhor = self._arrependimentos(J)
+        for j, a, m, v in zip(J.tolist(), arrependimento.tolist(), melhor.tolist(), self.versao[J].tolist()):
+            # Maior arrependimento primeiro; empate, menor custo
+            heappush(self.heap, (-a, m, j, v))
+
+    def _abrir_rota(self, j, o):
+        # Nem sozinho o serviço cabe em uma rota viável
+        if self.q[j] > self.capacidade:
+            raise ValueError("Há serviço com demanda maior que a capacidade do veículo")
+        if not np.isfinite(self.sozinho[j]):
+            raise ValueError(f"Serviço {self.servicos[j]['id']} inalcançável a partir do depósito")
+        r = self._nova_coluna()
+        self.rotas.append(Rota(self.matriz, self.deposito, [self._orientado(j, o)]))
+        self.atendido[j] = True
+        self._calcular_coluna(r, self._pendentes())
+        return r
+
+    def _inserir(self, j, r):
+        """Insere j na rota r na posição guardada e atualiza só o que a inserção afeta"""
+        p = int(self.P[j, r])
+        rota = self.rotas[r]
+        rota.inserir(p, self._orientado(j, int(self.O[j, r])))
+        self.atendido[j] = True
+
+        J = self._pendentes()
+        J = J[np.isfinite(self.C[J, r])]
+        # Quem não cabe mais fica sem essa opção
+        cabem = rota.carga + self.q[J] <= self.capacidade
+        self.C[J[~cabem], r] = INF
+        J = J[cabem]
+
+        # A ligação p foi desfeita: quem a usava recalcula a rota toda
+        desfeita = self.P[J, r] == p
+        self._calcular_coluna(r, J[desfeita])
+
+        # Os demais só comparam com as duas ligações novas (p e p + 1)
+        J = J[~desfeita]
+        self.P[J, r] += self.P[J, r] > p
+        anteriores, proximos = rota.ligacoes()
+        custo, posicao, orientacao = self._melhores_posicoes(J, anteriores[p:p + 2], proximos[p:p + 2], p)
+        melhor = custo < self.C[J, r]
+        J = J[melhor]
+        self.C[J, r], self.P[J, r], self.O[J, r] = custo[melhor], posicao[melhor], orientacao[melhor]
+
+    def semear(self):
+        """Abre as rotas mínimas com os serviços mais afastados entre si (farthest-first)"""
+        n = len(self.servicos)
+        if not n:
+            return
+        dist = self.matriz_servicos.dist
+        afastamento = np.where(np.isfinite(self.sozinho), self.sozinho, -INF)
+        for _ in range(min(self._rotas_minimas(), n)):
+            j = int(np.argmax(np.where(self.atendido, -INF, afastamento)))
+            self._abrir_rota(j, int(self.orientacao_sozinho[j]))
+            afastamento = np.minimum(afastamento, np.minimum(dist[j], dist[:, j]))
+
+    def construir(self):
+        self.semear()
+        self._enfileirar(self._pendentes())
+        while self.heap:
+            _, _, j, versao = heappop(self.heap)
+            if self.atendido[j] or versao != self.versao[j]:
+                continue
+
+            linha = self.C[j, :len(self.rotas)]
+            r = int(np.argmin(linha)) if len(linha) else -1
+            if r >= 0 and np.isfinite(linha[r]) and linha[r] <= self.sozinho[j]:
+                coluna_antiga = self.C[:, r].copy()
+                self._inserir(j, r)
+                abriu = False
+            else:
+                r = self._abrir_rota(j, int(self.orientacao_sozinho[j]))
+                coluna_antiga = np.full(len(self.C), INF)
+                abriu = True
+
+            J = self._pendentes()
+            if abriu and len(self.rotas) < self.k:
+                # Com menos de k opções, uma rota nova muda quantas entram na conta
+                self._enfileirar(J)
+            else:
+                self._enfileirar(J[self.C[J, r] != coluna_antiga[J]])
+
+        return self.rotas
+
+    def _orientado(self, j, o):
+        """Dict do serviço j na orientação o (0: como no arquivo, 1: invertido)"""
+        s = self.servicos[j]
+        return s if o == 0 else orientar(s, s['v'], s['u'])
+
+@medido()
+def regret_constructor(grafo, capacidade, deposito='1', k=2):
+    """Constrói uma solução por inserção paralela regret-k"""
+    if not grafo.matriz_servicos().servicos:
+        print("Nenhum serviço requerido encontrado no grafo")
+        return []
+    rotas = InsercaoRegret(grafo, capacidade, deposito, k).construir()
+    # Cada aresta na melhor direção para a sequência construída
+    for rota in rotas:
+        rota.reconstruir(orientar_rota(rota, grafo, deposito)[0])
+    return rotas
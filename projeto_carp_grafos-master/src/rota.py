@@ -0,0 +1,83 @@
+import numpy as np
+
+class Rota:
+    """Sequência de serviços de uma rota com cargas e custos acumulados.
+
+    Guarda, ao lado dos dicts dos serviços (já orientados), os índices de
+    vértice de início e fim de cada um e os prefixos de carga e de custo
+    (deslocamentos + serviços, a partir do depósito). Com eles a carga e o
+    custo total saem em O(1), e inserir só refaz os prefixos a partir da
+    posição alterada.
+
+    Para o resto do código continua sendo uma sequência de dicts: len(),
+    iteração e rota[i] devolvem os serviços.
+    """
+
+    __slots__ = ('servicos', 'inicios', 'fins', 'prefixo_carga', 'prefixo_custo', '_dist', '_indice', 'deposito')
+
+    def __init__(self, matriz, deposito, servicos=()):
+        self._dist = matriz.dist
+        self._indice = matriz.indice
+        self.deposito = matriz.indice[deposito]
+        self.reconstruir(servicos)
+
+    def reconstruir(self, servicos):
+        """Troca toda a sequência (por exemplo, depois de reorientar as arestas)"""
+        self.servicos = list(servicos)
+        self.inicios = [self._indice[s['u']] for s in self.servicos]
+        self.fins = [self._indice[s['v']] for s in self.servicos]
+        self.prefixo_carga = [0] * (len(self.servicos) + 1)
+        self.prefixo_custo = [0] * (len(self.servicos) + 1)
+        self._atualizar(0)
+
+    def _atualizar(self, inicio):
+        """Refaz os prefixos das posições inicio em diante"""
+        del self.prefixo_carga[inicio + 1:]
+        del self.prefixo_custo[inicio + 1:]
+        if inicio >= len(self.servicos):
+            return
+        # Deslocamentos até cada serviço alterado em uma única consulta à matriz
+        anteriores = [self.fim_anterior(inicio)] + self.fins[inicio:-1]
+        ligacoes = self._dist[anteriores, self.inicios[inicio:]].tolist()
+        carga, custo = self.prefixo_carga[inicio], self.prefixo_custo[inicio]
+        for s, ligacao in zip(self.servicos[inicio:], ligacoes):
+            carga += s['demanda']
+            custo += ligacao + s['custo']
+            self.prefixo_carga.append(carga)
+            self.prefixo_custo.append(custo)
+
+    def fim_anterior(self, posicao):
+        """Vértice de onde se chega à posição: fim do serviço anterior ou o depósito"""
+        return self.fins[posicao - 1] if posicao > 0 else self.deposito
+
+    @property
+    def carga(self):
+        return self.prefixo_carga[-1]
+
+    @property
+    def custo(self):
+        """Custo total, com a saída e a volta ao depósito"""
+        if not self.servicos:
+            return 0
+        return self.prefixo_custo[-1] + self._dist[self.fins[-1], self.deposito].item()
+
+    def ligacoes(self):
+        """Arrays (anteriores, proximos) com as pontas de cada posição de inserção 0..len"""
+        anteriores = np.array([self.deposito] + self.fins, dtype=np.int64)
+        proximos = np.array(self.inicios + [self.deposito], dtype=np.int64)
+        return anteriores, proximos
+
+    def inserir(self, posicao, servico):
+        self.servicos.insert(posicao, servico)
+        self.inicios.insert(posicao, self._indice[servico['u']])
+        self.fins.insert(posicao, self._indice[servico['v']])
+        self._atualizar(posicao)
+
+    def __len__(self):
+        return len(self.servicos)
+
+    def __iter__(self):
+        return iter(self.servicos)
+
+    def __getitem__(self, posicao):
+        return self.servicos[posicao]
@@ -1,35 +1,57 @@
-from greedy_constructor import calcular_custo_rota
+import os
 
-def salvar_solucao(rotas, grafo, capacidade, nome_arquivo_saida, deposito='1'):
-    # Cálculo dos totais
-    custo_total = 0
-    total_rotas = len(rotas)
-    # Para simplificação, clocks são fictícios
-    clocks = 0
-    clocks_melhor_sol = 0
-    linhas_rotas = []
-    
-    for idx, rota in enumerate(rotas, 1):
-        # Calcula demanda e custo total da rota (incluindo deslocamentos)
-        demanda_rota = sum(s['demanda'] for s in rota)
-        custo_rota = calcular_custo_rota(rota, grafo, deposito)
-        custo_total += custo_rota
-        
-        # Número de visitas (serviços + depósito no início e fim)
-        visitas = len(rota) + 1
-        
-        # Gera linha da rota
-        linha = f" 0 1 {idx} {demanda_rota} {custo_rota}  {visitas} (D 0,1,1)"
-        for s in rota:
-            linha += f" (S 0,{s['u']},{s['v']})"
-        linha += " (D 0,1,1)"
-        linhas_rotas.append(linha)
-    
-    # Salva o arquivo
-    with open(nome_arquivo_saida, 'w') as f:
-        f.write(f"{custo_total}\n")
-        f.write(f"{total_rotas}\n")
-        f.write(f"{clocks}\n")
-        f.write(f"{clocks_melhor_sol}\n")
-        for linha in linhas_rotas:
-            f.write(linha + '\n') 
\ No newline at end of file
+from greedy_constructor import orientar_rota
+from instrumentacao import medido
+from rota import Rota
+
+def formatar_custo(custo):
+    # A matriz de distâncias trabalha com float, mas os custos das instâncias são inteiros
+    if custo != float('inf') and custo == int(custo):
+        return str(int(custo))
+    return str(custo)
+
+def escrever_atomico(caminho, conteudo):
+    """Escreve em um temporário na mesma pasta e renomeia sobre o destino.
+
+    Quem lê o arquivo (ou um lote interrompido) vê a versão anterior ou a
+    nova inteira, nunca um sol-*.dat pela metade.
+    """
+    pasta, nome = os.path.split(os.path.abspath(caminho))
+    # Um temporário por processo: workers diferentes nunca disputam o mesmo
+    temporario = os.path.join(pasta, f".{nome}.{os.getpid()}.tmp")
+    try:
+        with open(temporario, 'w') as f:
+            f.write(conteudo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.unlink(temporario)
+        raise
+
+@medido()
+def salvar_solucao(rotas, grafo, capacidade, nome_arquivo_saida, deposito='1', clocks=0, clocks_melhor_sol=0,
+                   custos=None, cargas=None):
+    # clocks: tempo total da resolução; clocks_melhor_sol: tempo até a melhor solução
+    # custos/cargas: valores por rota já conhecidos pelo solver; com eles (ou com
+    # rotas do tipo Rota, que os mantêm) as rotas são escritas como vieram, sem
+    # reorientar nem recalcular
+    if custos is None and all(isinstance(rota, Rota) for rota in rotas):
+        custos = [rota.custo for rota in rotas]
+        cargas = [rota.carga for rota in rotas] if cargas is None else cargas
+    if custos is None:
+        orientadas = [orientar_rota(rota, grafo, deposito) for rota in rotas]
+        rotas = [rota for rota, _ in orientadas]
+        custos = [custo for _, custo in orientadas]
+    if cargas is None:
+        cargas = [sum(s['demanda'] for s in rota) for rota in rotas]
+    custo_total = sum(custos)
+
+    # Cabeçalho e uma linha por rota, com os serviços entre duas visitas ao depósito
+    linhas = [formatar_custo(custo_total), str(len(rotas)), str(clocks), str(clocks_melhor_sol)]
+    for idx, (rota, carga, custo) in enumerate(zip(rotas, cargas, custos), 1):
+        visitas = ' '.join(['(D 0,1,1)', *(f"(S {s['id']},{s['u']},{s['v']})" for s in rota), '(D 0,1,1)'])
+        linhas.append(f" 0 1 {idx} {carga} {formatar_custo(custo)}  {len(rota) + 2} {visitas}")
+    linhas.append('')
+
+    escrever_atomico(nome_arquivo_saida, '\n'.join(linhas))
+    return custo_total
@@ -0,0 +1,105 @@
+import numpy as np
+
+from greedy_constructor import coletar_servicos, orientar
+from instrumentacao import medido
+
+INF = float('inf')
+
+@medido()
+def rota_gigante(servicos, grafo, deposito):
+    """Ordena todos os serviços em uma única rota pelo vizinho mais próximo.
+
+    A partir do depósito, segue sempre para o serviço não atendido cujo início
+    está mais perto do ponto atual; arestas podem ser começadas por qualquer
+    ponta. Cada passo é um argmin vetorizado sobre uma linha da matriz.
+    """
+    matriz = grafo.matriz_distancias()
+    dist, indice = matriz.dist, matriz.indice
+    inicios = np.array([indice[s['u']] for s in servicos])
+    fins = np.array([indice[s['v']] for s in servicos])
+    arestas = np.array([s['tipo'] == 'aresta' for s in servicos])
+    restantes = np.ones(len(servicos), dtype=bool)
+
+    atual = indice[deposito]
+    rota = []
+    for _ in range(len(servicos)):
+        direto = np.where(restantes, dist[atual, inicios], INF)
+        invertido = np.where(restantes & arestas, dist[atual, fins], INF)
+        k_direto = int(np.argmin(direto))
+        k_invertido = int(np.argmin(invertido))
+
+        if invertido[k_invertido] < direto[k_direto]:
+            k = k_invertido
+            servico = servicos[k]
+            rota.append(orientar(servico, servico['v'], servico['u']))
+            atual = inicios[k]
+        else:
+            # Se nada é alcançável, segue a ordem original
+            k = k_direto if direto[k_direto] < INF else int(np.flatnonzero(restantes)[0])
+            rota.append(servicos[k])
+            atual = fins[k]
+        restantes[k] = False
+
+    return rota
+
+@medido()
+def split(rota_gigante, grafo, capacidade, deposito):
+    """Corta a rota gigante em rotas viáveis de custo mínimo (Split de Prins).
+
+    Calcula o menor caminho no grafo auxiliar acíclico em que o arco (i, j)
+    representa a rota que atende os serviços i+1..j. Para cada i os arcos são
+    estendidos até estourar a capacidade, então o custo é O(n·k), com k o
+    máximo de serviços por rota.
+    """
+    matriz = grafo.matriz_distancias()
+    dist, indice = matriz.dist, matriz.indice
+    dep = indice[deposito]
+    inicios = [indice[s['u']] for s in rota_gigante]
+    fins = [indice[s['v']] for s in rota_gigante]
+    saida = dist[dep, inicios].tolist()
+    volta = dist[fins, dep].tolist()
+    ligacao = dist[fins[:-1], inicios[1:]].tolist()
+    custos = [s['custo'] for s in rota_gigante]
+    demandas = [s['demanda'] for s in rota_gigante]
+
+    n = len(rota_gigante)
+    V = [0] + [INF] * n
+    anterior = [-1] * (n + 1)
+    for i in range(n):
+        if V[i] == INF:
+            continue
+        carga = 0
+        custo = 0
+        for j in range(i, n):
+            carga += demandas[j]
+            if carga > capacidade:
+                break
+            if j == i:
+                custo = saida[i] + custos[i]
+            else:
+                custo += ligacao[j - 1] + custos[j]
+            total = V[i] + custo + volta[j]
+            if total < V[j + 1]:
+                V[j + 1] = total
+                anterior[j + 1] = i
+
+    if V[n] == INF:
+        raise ValueError("Não foi possível dividir a rota gigante em rotas viáveis")
+
+    rotas = []
+    j = n
+    while j > 0:
+        i = anterior[j]
+        rotas.append(rota_gigante[i:j])
+        j = i
+    rotas.reverse()
+    return rotas
+
+@medido()
+def split_constructor(grafo, capacidade, deposito='1'):
+    """Constrói uma solução por rota gigante + Split (route-first cluster-second)"""
+    servicos = coletar_servicos(grafo)
+    if not servicos:
+        print("Nenhum serviço requerido encontrado no grafo")
+        return []
+    return split(rota_gigante(servicos, grafo, deposito), grafo, capacidade, deposito)
@@ -1,95 +1,214 @@
+import hashlib
+import os
+
+import numpy as np
+
 from grafo import Grafo
 
-def ler_arquivo_dat(nome_arquivo):
-    grafo = Grafo()
+# Seções do arquivo .dat e o prefixo das linhas de dados de cada uma
+SECOES = {'ReN.': 'ReN', 'ReE.': 'ReE', 'EDGE': 'EDGE', 'ReA.': 'ReA', 'ARC': 'ARC'}
+PREFIXOS = {'ReN': 'N', 'ReE': 'E', 'EDGE': 'NrE', 'ReA': 'A', 'ARC': 'NrA'}
+
+# Código de seção guardado na primeira coluna de cada ligação
+RE_E, EDGE, RE_A, ARC = range(4)
+CODIGOS = {'ReE': RE_E, 'EDGE': EDGE, 'ReA': RE_A, 'ARC': ARC}
+
+VERSAO_CACHE = 1
+TAMANHO_CABECALHO_CACHE = 9
+
+def ler_instancia(nome_arquivo):
+    """Lê um .dat em uma única passada e devolve a instância em arrays.
+
+    Retorna um dicionário com:
+      - cabecalho: [capacidade, deposito]
+      - nos_req: linhas [no, demanda, custo_servico]
+      - ligacoes: linhas [secao, u, v, custo, demanda, custo_servico]
+    """
     capacidade = None
+    deposito = 1
+    nos_req = []
+    ligacoes = []
+    secao_atual = None
+    prefixo = None
 
-    try:
-        with open(nome_arquivo, 'r') as file:
-            lines = [line.strip() for line in file if line.strip()]
-
-        # Lê a capacidade do arquivo
-        for line in lines:
-            if line.startswith('Capacity:'):
-                try:
-                    capacidade = int(line.split(':')[1].strip())
-                    break
-                except ValueError:
-                    raise ValueError(f"Erro ao converter capacidade para número em {nome_arquivo}")
-
-        if capacidade is None:
-            raise ValueError(f"Capacidade não encontrada no arquivo {nome_arquivo}")
-
-        # Remove linhas de comentário e vazias para processamento do grafo
-        lines = [line for line in lines if line and not line.startswith('#')]
-        
-        secao_atual = None
-        vertices_processados = 0
-        arestas_processadas = 0
-        arcos_processados = 0
-
-        for line in lines:
-            if line.startswith('ReN.'):
-                secao_atual = 'ReN'
-                continue
-            elif line.startswith('ReE.'):
-                secao_atual = 'ReE'
-                continue
-            elif line.startswith('EDGE'):
-                secao_atual = 'EDGE'
-                continue
-            elif line.startswith('ReA.'):
-                secao_atual = 'ReA'
+    with open(nome_arquivo, 'r') as file:
+        for line in file:
+            parts = line.split()
+            if not parts:
                 continue
-            elif line.startswith('ARC'):
-                secao_atual = 'ARC'
+            chave = parts[0]
+
+            if chave in SECOES:
+                secao_atual = SECOES[chave]
+                prefixo = PREFIXOS[secao_atual]
                 continue
 
-            parts = line.split()
-            if not parts:
+            if secao_atual is None:
+                # Cabeçalho
+                if chave == 'Capacity:':
+                    try:
+                        capacidade = int(parts[1])
+                    except (IndexError, ValueError):
+                        raise ValueError(f"Erro ao converter capacidade para número em {nome_arquivo}")
+                elif chave == 'Depot':
+                    deposito = int(parts[-1])
                 continue
 
+            if not chave.startswith(prefixo) or chave.startswith('#'):
+                continue  # comentários e linhas de texto no fim do arquivo
+
             try:
                 if secao_atual == 'ReN':
-                    no = parts[0][1:]  # remove o 'N'
-                    grafo.add_vertice_req(no)
-                    vertices_processados += 1
-
-                elif secao_atual == 'ReE':
-                    u, v = parts[1], parts[2]
+                    no = int(chave[1:])  # remove o 'N'
+                    demanda = int(parts[1]) if len(parts) > 1 else 0
+                    custo_servico = int(parts[2]) if len(parts) > 2 else 0
+                    nos_req.append((no, demanda, custo_servico))
+                else:
+                    u, v = int(parts[1]), int(parts[2])
                     custo = int(parts[3])
+                    # Ligações não requeridas não têm demanda
                     demanda = int(parts[4]) if len(parts) > 4 else 0
-                    grafo.add_aresta_req(u, v, [custo, demanda])
-                    arestas_processadas += 1
-
-                elif secao_atual == 'EDGE':
-                    if len(parts) >= 3:
-                        u, v = parts[1], parts[2]
-                        custo = int(parts[3])
-                        demanda = 0  # Arestas não requeridas não têm demanda
-                        grafo.add_aresta(u, v, [custo, demanda])
-                        arestas_processadas += 1
-
-                elif secao_atual == 'ReA':
-                    u, v = parts[1], parts[2]
-                    custo = int(parts[3])
-                    demanda = int(parts[4]) if len(parts) > 4 else 0
-                    grafo.add_arco_req(u, v, [custo, demanda])
-                    arcos_processados += 1
+                    custo_servico = int(parts[5]) if len(parts) > 5 else custo
+                    ligacoes.append((CODIGOS[secao_atual], u, v, custo, demanda, custo_servico))
+            except (IndexError, ValueError) as e:
+                raise ValueError(f"Erro ao processar linha '{line.strip()}' na seção {secao_atual}: {str(e)}")
 
-                elif secao_atual == 'ARC':
-                    if len(parts) >= 4 and parts[0].startswith('NrA'):
-                        u, v = parts[1], parts[2]
-                        custo = int(parts[3])
-                        demanda = 0  # Arcos não requeridos não têm demanda
-                        grafo.add_arco(u, v, [custo, demanda])
-                        arcos_processados += 1
+    if capacidade is None:
+        raise ValueError(f"Capacidade não encontrada no arquivo {nome_arquivo}")
 
-            except (IndexError, ValueError) as e:
-                raise ValueError(f"Erro ao processar linha '{line}' na seção {secao_atual}: {str(e)}")
+    return {
+        'cabecalho': np.array([capacidade, deposito], dtype=np.int64),
+        'nos_req': np.array(nos_req, dtype=np.int64).reshape(-1, 3),
+        'ligacoes': np.array(ligacoes, dtype=np.int64).reshape(-1, 6),
+    }
+
+def montar_grafo(dados):
+    """Preenche um Grafo direto a partir dos arrays de ler_instancia"""
+    grafo = Grafo()
+    capacidade, deposito = dados['cabecalho'].tolist()
+    grafo.deposito = str(deposito)
+
+    for no, demanda, custo_servico in dados['nos_req'].tolist():
+        no = str(no)
+        grafo.vertices.add(no)
+        grafo.vertices_req[no] = [custo_servico, demanda]
+
+    for secao, u, v, custo, demanda, _ in dados['ligacoes'].tolist():
+        u, v = str(u), str(v)
+        grafo.vertices.add(u)
+        grafo.vertices.add(v)
+        if secao in (RE_E, EDGE):
+            aresta = tuple(sorted((u, v)))
+            grafo.arestas[aresta] = [custo, demanda]
+            if secao == RE_E:
+                grafo.arestas_req[aresta] = [custo, demanda]
+        else:
+            grafo.arcos[(u, v)] = [custo, demanda]
+            if secao == RE_A:
+                grafo.arcos_req[(u, v)] = [custo, demanda]
+
+    grafo.invalidar_cache()
+    return grafo, capacidade
+
+def hash_arquivo(nome_arquivo):
+    """Hash blake2b de 128 bits do conteúdo do arquivo"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(nome_arquivo, 'rb') as file:
+        for bloco in iter(lambda: file.read(1 << 20), b''):
+            h.update(bloco)
+    return h.digest()
+
+def _hash_arquivo(nome_arquivo):
+    """Hash de 128 bits do conteúdo, como dois int64"""
+    return np.frombuffer(hash_arquivo(nome_arquivo), dtype=np.int64).tolist()
+
+def _caminho_cache(nome_arquivo, pasta_cache):
+    nome = os.path.splitext(os.path.basename(nome_arquivo))[0]
+    return os.path.join(pasta_cache, f"{nome}.npy")
+
+def carregar_cache(nome_arquivo, pasta_cache):
+    """Devolve os arrays em cache da instância, ou None se o cache não vale mais.
+
+    O cache é um único .npy de int64 lido por memmap:
+    [versao, tamanho, mtime_ns, hash0, hash1, capacidade, deposito, k, m,
+    nos_req (k x 3), ligacoes (m x 6)]. É aceito direto quando tamanho e
+    mtime batem; se só o mtime mudou, o hash do conteúdo decide e, batendo,
+    o mtime novo é gravado para as próximas leituras não refazerem o hash.
+    """
+    caminho = _caminho_cache(nome_arquivo, pasta_cache)
+    try:
+        bruto = np.load(caminho, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if bruto.ndim != 1 or len(bruto) < TAMANHO_CABECALHO_CACHE:
+        return None
+
+    versao, tamanho, mtime_ns, hash0, hash1, capacidade, deposito, k, m = bruto[:TAMANHO_CABECALHO_CACHE].tolist()
+    if versao != VERSAO_CACHE or len(bruto) != TAMANHO_CABECALHO_CACHE + 3 * k + 6 * m:
+        return None
+    info = os.stat(nome_arquivo)
+    if info.st_size != tamanho:
+        return None
+    if info.st_mtime_ns != mtime_ns:
+        if _hash_arquivo(nome_arquivo) != [hash0, hash1]:
+            return None
+        _atualizar_mtime_cache(caminho, info.st_mtime_ns)
+
+    inicio = TAMANHO_CABECALHO_CACHE
+    return {
+        'cabecalho': np.array([capacidade, deposito], dtype=np.int64),
+        'nos_req': bruto[inicio:inicio + 3 * k].reshape(k, 3),
+        'ligacoes': bruto[inicio + 3 * k:].reshape(m, 6),
+    }
+
+def _atualizar_mtime_cache(caminho, mtime_ns):
+    """Regrava só o mtime no cabeçalho do cache (uma palavra de int64, no lugar)"""
+    try:
+        bruto = np.load(caminho, mmap_mode='r+')
+        bruto[2] = mtime_ns
+        bruto.flush()
+    except (OSError, ValueError):
+        # Cache em pasta sem escrita: continua valendo, só refaz o hash da próxima vez
+        pass
+
+def salvar_cache(nome_arquivo, pasta_cache, dados):
+    """Grava os arrays da instância no cache de forma atômica"""
+    os.makedirs(pasta_cache, exist_ok=True)
+    caminho = _caminho_cache(nome_arquivo, pasta_cache)
+    info = os.stat(nome_arquivo)
+    cabecalho = [VERSAO_CACHE, info.st_size, info.st_mtime_ns, *_hash_arquivo(nome_arquivo),
+                 *dados['cabecalho'].tolist(), len(dados['nos_req']), len(dados['ligacoes'])]
+    bruto = np.concatenate([
+        np.array(cabecalho, dtype=np.int64),
+        dados['nos_req'].ravel(),
+        dados['ligacoes'].ravel(),
+    ])
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'wb') as file:
+        np.save(file, bruto)
+    os.replace(temporario, caminho)
+
+def ler_dados_instancia(nome_arquivo, pasta_cache=None):
+    """Arrays de ler_instancia, vindos do cache quando ele ainda vale"""
+    dados = carregar_cache(nome_arquivo, pasta_cache) if pasta_cache else None
+    if dados is None:
+        dados = ler_instancia(nome_arquivo)
+        if pasta_cache:
+            salvar_cache(nome_arquivo, pasta_cache, dados)
+    return dados
+
+def ler_arquivo_dat(nome_arquivo, pasta_cache=None):
+    try:
+        dados = ler_dados_instancia(nome_arquivo, pasta_cache)
+        grafo, capacidade = montar_grafo(dados)
 
-        print(f"  Leitura concluída: {vertices_processados} vértices, {arestas_processadas} arestas, {arcos_processados} arcos")
+        ligacoes = dados['ligacoes']
+        eh_aresta = np.isin(ligacoes[:, 0], (RE_E, EDGE))
+        print(f"  Leitura concluída: {len(dados['nos_req'])} vértices, "
+              f"{int(eh_aresta.sum())} arestas, {int((~eh_aresta).sum())} arcos")
         return grafo, capacidade
 
-    except Exception as e:
-        raise Exception(f"Erro ao ler arquivo {nome_arquivo}: {str(e)}") 
\ No newline at end of file
+    # Só erros de leitura/formato; TempoEsgotado e MemoryError dos limites
+    # por instância precisam chegar intactos a processar_arquivo
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        raise Exception(f"Erro ao ler arquivo {nome_arquivo}: {str(e)}")
@@ -0,0 +1,202 @@
+import os
+import re
+import sys
+import argparse
+from multiprocessing import Pool, cpu_count
+
+from utils_grafo import ler_dados_instancia, montar_grafo
+from greedy_constructor import coletar_servicos
+from distancias import dijkstra_indices
+
+# Visitas de uma linha de rota: (D 0,1,1) para o depósito e (S id,u,v) para serviços
+VISITA = re.compile(r'\((\w)\s+([^)]*)\)')
+TOLERANCIA = 1e-6
+
+def ler_solucao_completa(caminho):
+    """Lê o cabeçalho e todas as rotas de um sol-*.dat escrito por salvar_solucao"""
+    with open(caminho, 'r') as f:
+        linhas = [linha for linha in f.read().splitlines() if linha.strip()]
+    if len(linhas) < 4:
+        raise ValueError("Cabeçalho incompleto")
+
+    rotas = []
+    for numero, linha in enumerate(linhas[4:], 5):
+        inicio_visitas = linha.find('(')
+        campos = linha[:inicio_visitas].split() if inicio_visitas >= 0 else linha.split()
+        if len(campos) != 6:
+            raise ValueError(f"Linha {numero}: esperados 6 campos antes das visitas, há {len(campos)}")
+        visitas = [(tipo, [x.strip() for x in valores.split(',')])
+                   for tipo, valores in VISITA.findall(linha[inicio_visitas:])] if inicio_visitas >= 0 else []
+        rotas.append({
+            'linha': numero,
+            'deposito': int(campos[0]),
+            'dia': int(campos[1]),
+            'id': int(campos[2]),
+            'demanda': float(campos[3]),
+            'custo': float(campos[4]),
+            'visitas': int(campos[5]),
+            'sequencia': visitas,
+        })
+
+    return {
+        'custo_total': float(linhas[0]),
+        'num_rotas': int(linhas[1]),
+        'clocks': int(linhas[2]),
+        'clocks_melhor_sol': int(linhas[3]),
+        'rotas': rotas,
+    }
+
+class DistanciasParciais:
+    """Linhas da matriz de distâncias só para as origens que a validação usa.
+
+    Uma rota só sai do depósito ou do fim de um serviço, então basta um
+    Dijkstra por ponta de serviço, em vez de um por vértice do grafo.
+    Oferece dist[i, j] e indice como MatrizDistancias.
+    """
+
+    def __init__(self, grafo, servicos):
+        compacto = grafo.compactar()
+        self.indice = compacto.indice
+        adj = compacto.lista_adjacencia()
+        origens = {self.indice[grafo.deposito]}
+        for s in servicos:
+            origens.add(self.indice[s['u']])
+            origens.add(self.indice[s['v']])
+        self.linhas = {origem: dijkstra_indices(adj, origem)[0] for origem in origens}
+
+    @property
+    def dist(self):
+        return self
+
+    def __getitem__(self, par):
+        origem, destino = par
+        return self.linhas[origem][destino]
+
+def validar(solucao, servicos, matriz, capacidade, deposito):
+    """Lista os problemas de uma solução lida por ler_solucao_completa.
+
+    Confere formato das visitas, capacidade, direção dos arcos, o custo e a
+    demanda declarados de cada rota, os totais do cabeçalho e se cada
+    serviço requerido aparece exatamente uma vez. Os custos são recalculados
+    com a matriz de distâncias da instância (ou DistanciasParciais).
+    """
+    erros = []
+    por_id = {s['id']: s for s in servicos}
+    atendidos = {}
+    dist, indice = matriz.dist, matriz.indice
+    dep = indice[deposito]
+    custo_total = 0
+
+    if solucao['num_rotas'] != len(solucao['rotas']):
+        erros.append(f"Cabeçalho declara {solucao['num_rotas']} rotas, arquivo tem {len(solucao['rotas'])}")
+
+    for esperado, rota in enumerate(solucao['rotas'], 1):
+        local = f"Rota {rota['id']} (linha {rota['linha']})"
+        if rota['id'] != esperado:
+            erros.append(f"{local}: identificador fora de ordem, esperado {esperado}")
+        sequencia = rota['sequencia']
+        if len(sequencia) < 2 or sequencia[0][0] != 'D' or sequencia[-1][0] != 'D':
+            erros.append(f"{local}: deve começar e terminar no depósito (D 0,1,1)")
+        if rota['visitas'] != len(sequencia):
+            erros.append(f"{local}: declara {rota['visitas']} visitas, tem {len(sequencia)}")
+
+        demanda = 0
+        custo = 0
+        atual = dep
+        for tipo, valores in sequencia:
+            if tipo == 'D':
+                continue
+            if tipo != 'S' or len(valores) != 3:
+                erros.append(f"{local}: visita inválida ({tipo} {','.join(valores)})")
+                continue
+            id_servico, u, v = int(valores[0]), valores[1], valores[2]
+            servico = por_id.get(id_servico)
+            if servico is None:
+                erros.append(f"{local}: serviço {id_servico} não é requerido")
+                continue
+            atendidos[id_servico] = atendidos.get(id_servico, 0) + 1
+
+            if servico['tipo'] == 'aresta':
+                direcao_valida = {u, v} == {servico['u'], servico['v']}
+            else:
+                direcao_valida = (u, v) == (servico['u'], servico['v'])
+            if not direcao_valida:
+                erros.append(f"{local}: serviço {id_servico} atendido como ({u},{v}), "
+                             f"o {servico['tipo']} é ({servico['u']},{servico['v']})")
+                continue
+
+            demanda += servico['demanda']
+            custo += dist[atual, indice[u]] + servico['custo']
+            atual = indice[v]
+        custo += dist[atual, dep]
+        custo_total += custo
+
+        if demanda > capacidade:
+            erros.append(f"{local}: demanda {demanda} excede a capacidade {capacidade}")
+        if abs(demanda - rota['demanda']) > TOLERANCIA:
+            erros.append(f"{local}: declara demanda {rota['demanda']:g}, calculada {demanda}")
+        if abs(custo - rota['custo']) > TOLERANCIA:
+            erros.append(f"{local}: declara custo {rota['custo']:g}, calculado {custo:g}")
+
+    if abs(custo_total - solucao['custo_total']) > TOLERANCIA:
+        erros.append(f"Custo total declarado {solucao['custo_total']:g}, calculado {custo_total:g}")
+    repetidos = sorted(i for i, vezes in atendidos.items() if vezes > 1)
+    faltando = sorted(por_id.keys() - atendidos.keys())
+    if repetidos:
+        erros.append(f"Serviços atendidos mais de uma vez: {repetidos}")
+    if faltando:
+        erros.append(f"Serviços não atendidos: {faltando}")
+    return erros
+
+def validar_arquivo(args):
+    """Valida um sol-*.dat contra a sua instância; retorna (nome, erros)"""
+    caminho_solucao, caminho_instancia, pasta_cache = args
+    nome = os.path.basename(caminho_solucao)
+    try:
+        grafo, capacidade = montar_grafo(ler_dados_instancia(caminho_instancia, pasta_cache))
+        solucao = ler_solucao_completa(caminho_solucao)
+        servicos = coletar_servicos(grafo)
+        return nome, validar(solucao, servicos, DistanciasParciais(grafo, servicos),
+                             capacidade, grafo.deposito)
+    except Exception as e:
+        return nome, [f"Erro ao validar: {str(e)}"]
+
+def ler_argumentos():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Valida as soluções sol-*.dat de uma pasta")
+    parser.add_argument('pasta', nargs='?', default=os.path.join(script_dir, 'solucoes'),
+                        help="pasta com os sol-*.dat")
+    parser.add_argument('--instancias', default=os.path.join(script_dir, '..', 'selected_instances'),
+                        help="pasta com os .dat das instâncias")
+    parser.add_argument('--processos', type=int, default=cpu_count())
+    return parser.parse_args()
+
+def main():
+    argumentos = ler_argumentos()
+    pasta_cache = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+    args = []
+    for arquivo in sorted(os.listdir(argumentos.pasta)):
+        if not arquivo.startswith('sol-') or not arquivo.endswith('.dat'):
+            continue
+        caminho_instancia = os.path.join(argumentos.instancias, f"{arquivo[4:-4]}.dat")
+        if not os.path.exists(caminho_instancia):
+            print(f"{arquivo}: instância {caminho_instancia} não encontrada, ignorado")
+            continue
+        args.append((os.path.join(argumentos.pasta, arquivo), caminho_instancia, pasta_cache))
+
+    invalidas = 0
+    with Pool(processes=argumentos.processos) as pool:
+        for nome, erros in pool.imap_unordered(validar_arquivo, args, chunksize=4):
+            if erros:
+                invalidas += 1
+                print(f"✗ {nome}")
+                for erro in erros:
+                    print(f"    {erro}")
+
+    print(f"\n{len(args)} soluções verificadas, {len(args) - invalidas} válidas, {invalidas} inválidas")
+    if invalidas:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()